@@ -0,0 +1,170 @@
+"""
+Time RefParser.clean_refstring() against the step-by-step implementation that it
+replaced, and check that the two give the same output on a corpus of reference strings
+and on random strings made of the characters that clean_refstring() rewrites.
+
+    python benchmarks/clean_refstring.py [-n FUZZ] [--canon ESV]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons  # noqa: E402
+from bref.refparser import RefParser  # noqa: E402
+
+CORPUS = [
+    "Gen 3:5-4:7; 5:8-10; Exod 3:2-Lev 4:5",
+    "Song of Songs 4 8 -- 5_3",
+    "(Rom 8:28\u201339)",
+    "[1 John 2:1&#8211;3, 5]",
+    "First Corinthians 13:1 and 13:4&#160;\u2013 7",
+    "Second Kings 2:11; Third John 4",
+    "Ps 23 title",
+    "Ps 51, heading",
+    "The Gospel of John 3:16",
+    "1,2Sam",
+    "1-2 Kings",
+    "Matt 5:3ff.; 6:9f",
+    "Isa 40:31\r\nJer 29:11",
+    "Heb 11:1 \u2014 12:2",
+    "Phlm 4\t-\t7",
+    "Jude v. 3",
+    "Rev 21:1 - - 4 ;; 22:1,,5..",
+]
+ALPHABET = list(
+    "GenRomPsSongof123 :;,.-_\\()[]{}<>\t\r\n\u00a0\u2010\u2013\u2014\x96"
+    "\u2009\u0663\u00b2\u017f\u0130"
+) + [
+    "and",
+    "first",
+    "Second",
+    "third",
+    "title",
+    "heading",
+    "The ",
+    ".v.",
+    "&#160;",
+    "&#8212;",
+    "&#x2012;",
+    "5",
+    "17",
+]
+
+
+def legacy_clean_refstring(refstr=""):
+    """RefParser.clean_refstring() as it was before it used translation tables"""
+    if refstr is None:
+        return None
+    refstr = re.sub(r"(^\W+|\W+$)", "", refstr)
+    refstr = re.sub(r"[\(\)\[\]\{\}\<\>]", "", refstr)  # remove brackets and parens
+    refstr = refstr.strip()  # Remove leading and trailing whitespace
+    refstr = refstr.strip("-,;.")  # leading and trailing separators
+    refstr = refstr.replace("and", ",")
+    refstr = refstr.replace("; ", ";")
+    refstr = refstr.replace(":", ".")
+    refstr = refstr.replace("_", " ")
+    refstr = refstr.replace("\\", "")
+    refstr = refstr.replace("&#160;", " ")
+    refstr = refstr.replace("\u00a0", " ")
+    refstr = refstr.replace("\t", " ")
+    refstr = refstr.replace("&#150;", "-")
+    refstr = refstr.replace("&#151;", "-")
+    refstr = refstr.replace("&#8211;", "-")
+    refstr = refstr.replace("&#8212;", "-")
+    refstr = refstr.replace("&#x2010;", "-")
+    refstr = refstr.replace("&#x2011;", "-")
+    refstr = refstr.replace("&#x2012;", "-")
+    refstr = refstr.replace("&#x2013;", "-")
+    refstr = refstr.replace("&#x2014;", "-")
+    refstr = refstr.replace("\u2010", "-")
+    refstr = refstr.replace("\u2011", "-")
+    refstr = refstr.replace("\u2011", "-")
+    refstr = refstr.replace("\u2013", "-")
+    refstr = refstr.replace("\u2014", "-")
+    refstr = refstr.replace("\x96", "-")
+    refstr = refstr.replace("\x97", "-")
+    refstr = refstr.replace("\r", ";")
+    refstr = refstr.replace("\n", ";")
+    refstr = refstr.replace(" -", "-")
+    refstr = refstr.replace("- ", "-")
+    while ";;" in refstr:
+        refstr = refstr.replace(";;", ";")
+    while "--" in refstr:
+        refstr = refstr.replace("--", "-")
+    while "  " in refstr:
+        refstr = refstr.replace("  ", " ")
+    while ".." in refstr:
+        refstr = refstr.replace("..", ".")
+    while ",," in refstr:
+        refstr = refstr.replace(",,", ",")
+    refstr = refstr.replace(" ,", ",")
+    refstr = refstr.replace(", ", ",")
+    refstr = refstr.replace(" ;", ";")
+    refstr = refstr.replace("; ", ";")
+    refstr = re.sub(r"([123])\s+([A-Za-z])", r"\1\2", refstr)
+    # These number words are sometimes used in the ordinal book names
+    # (1 John, etc.).
+    refstr = re.sub(r"(?i)first\s*", "1", refstr)
+    refstr = re.sub(r"(?i)second\s*", "2", refstr)
+    refstr = re.sub(r"(?i)third\s*", "3", refstr)
+    refstr = refstr.replace(" ", ".")
+    refstr = re.sub(r"Song\.[^0-9]*", "Song.", refstr)
+    refstr = re.sub(r"\.title", ".0", refstr, flags=re.I)
+    refstr = re.sub(r",\s*(heading|title)", "", refstr, flags=re.I)
+    refstr = re.sub(r"^The\W+", "", refstr)
+    refstr = refstr.replace(".v.", ".1.")
+
+    # Pattern like 1,2Sam should become 1Sam–2Sam
+    refstr = re.sub(r"^(\d+),(\d+)(\w+)", r"\1\3-\2\3", refstr)
+
+    # Pattern like 1-2Sam should become 1Sam-2Sam
+    refstr = re.sub(r"^(\d+)-(\d+)(\D+)", r"\1\3-\2\3", refstr)
+
+    return refstr
+
+
+def fuzz(count, seed=0):
+    rand = random.Random(seed)
+    return [
+        "".join(rand.choice(ALPHABET) for _ in range(rand.randrange(1, 24)))
+        for _ in range(count)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=100000, help="number of fuzz strings")
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    rp = RefParser(canons[args.canon])
+    corpus = CORPUS + [book.title for book in rp.canon.books if book.title]
+    for refstr in CORPUS:
+        try:
+            corpus.append(rp.format(rp.parse(refstr)))
+        except ValueError:
+            pass  # e.g. "Ps 23 title" cleans to "Ps.23title", which does not parse
+
+    for refstr in corpus + fuzz(args.n):
+        expected = legacy_clean_refstring(refstr)
+        assert rp.clean_refstring(refstr) == expected, (refstr, expected)
+
+    number = 20
+    legacy = timeit.timeit(
+        lambda: [legacy_clean_refstring(s) for s in corpus], number=number
+    )
+    current = timeit.timeit(
+        lambda: [rp.clean_refstring(s) for s in corpus], number=number
+    )
+    count = number * len(corpus)
+    print(f"{len(corpus)} corpus strings and {args.n} fuzz strings agree")
+    print(f"legacy:          {legacy / count * 1e6:8.2f} us/string")
+    print(f"clean_refstring: {current / count * 1e6:8.2f} us/string")
+
+
+if __name__ == "__main__":
+    main()
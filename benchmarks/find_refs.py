@@ -0,0 +1,91 @@
+"""
+Time scanning a large text for references with the patterns from refpat.make_patterns(),
+against the same patterns built with the plain alternation of book patterns that
+book_pattern() used to return, and check that both find the same references.
+
+    python benchmarks/find_refs.py [--size BYTES] [--canon ESV]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons, refpat  # noqa: E402
+from bref.ref import Ref  # noqa: E402
+from bref.refparser import RefParser  # noqa: E402
+
+PROSE = """In the beginning God created the heavens and the earth. Now the earth was formless
+and empty, and darkness was over the surface of the deep. And God said, Let there be light,
+and there was light. Jesus answered them, Destroy this temple, and in three days I will
+raise it up. Moses and Elijah, Samuel and the Kings, John, Mark, Luke and Acts; Romans and
+Galatians; the genealogy in general, as James and Jude, Job, Joel, Amos and Ezra said."""
+
+
+def legacy_book_pattern(canon):
+    return "(?:(?:" + "|".join([bk.pattern for bk in canon.books]) + ")\\.?)"
+
+
+def sample_text(canon, size, density=0.01, seed=0):
+    """prose with about one reference in every hundred words"""
+    rand = random.Random(seed)
+    words = PROSE.split()
+    total = len(canon.index)
+    result = []
+    length = 0
+    while length < size:
+        if rand.random() < density:
+            ref = Ref.from_ordinal(rand.randrange(total), canon)
+            word = "(%s %d:%d)" % (ref.name, ref.ch, ref.vs)
+        else:
+            word = rand.choice(words)
+        result.append(word)
+        length += len(word) + 1
+    return " ".join(result)
+
+
+def timed(label, func):
+    t = time.perf_counter()
+    result = func()
+    print(f"{label:36s} {time.perf_counter() - t:8.2f} s")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--size", type=int, default=1000000, help="text size")
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    canon = canons[args.canon]
+    rp = RefParser(canon)
+    text = sample_text(canon, args.size)
+    print(f"{len(text) / 1e6:.1f} MB of text")
+
+    patterns = refpat.make_patterns(canon)
+    book_pattern, refpat.book_pattern = refpat.book_pattern, legacy_book_pattern
+    try:
+        legacy_patterns = refpat.build_patterns(canon)
+    finally:
+        refpat.book_pattern = book_pattern
+
+    regex, legacy_regex = patterns["regexs"][0], legacy_patterns["regexs"][0]
+    legacy = timed("full pattern, legacy", lambda: list(legacy_regex.finditer(text)))
+    current = timed("full pattern", lambda: list(regex.finditer(text)))
+    assert [md.span() for md in current] == [md.span() for md in legacy]
+
+    legacy = timed(
+        "find_refs_in_text, legacy",
+        lambda: refpat.find_refs_in_text(text, legacy_patterns, refparser=rp),
+    )
+    current = timed(
+        "find_refs_in_text",
+        lambda: refpat.find_refs_in_text(text, patterns, refparser=rp),
+    )
+    assert current == legacy, "refs differ"
+    print(f"{len(current)} refs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Time the per-document setup of reference tagging: refpat.make_patterns(), which is cached
+on the canon, against build_patterns(), which it used to do on every call; and a
+book_replacer() substitution against the implementation that matched every book's
+pattern_strict for every name found.
+
+    python benchmarks/make_patterns.py [-n DOCUMENTS] [--canon NLT]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons, refpat  # noqa: E402
+
+NAMES = (
+    "Gen Genesis Exod Ps Psalm Isa Matt John Jn Rom 1 Cor 2 Tim Heb Jude Rev".split()
+)
+
+
+def legacy_book_replacer(canon, attr, flags=re.IGNORECASE):
+    def br(md):
+        text = md.group(0)
+        for book in canon.books:
+            if re.match(book.pattern_strict, text, flags=flags) is not None:
+                return book[attr]
+
+    return br
+
+
+def timed(label, count, func):
+    t = time.perf_counter()
+    for _ in range(count):
+        func()
+    print(f"{label:28s} {(time.perf_counter() - t) / count * 1e3:10.3f} ms/document")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=50, help="number of documents")
+    parser.add_argument("--canon", default="NLT", help="a canon with pattern_strict")
+    args = parser.parse_args(argv)
+    canon = canons[args.canon]
+    rand = random.Random(0)
+    text = " ".join(
+        "%s %d" % (rand.choice(NAMES), rand.randrange(1, 20)) for _ in range(200)
+    )
+
+    timed("build_patterns", args.n, lambda: refpat.build_patterns(canon))
+    timed("make_patterns", args.n, lambda: refpat.make_patterns(canon))
+
+    regex = re.compile(refpat.book_pattern(canon))
+    expected = regex.sub(legacy_book_replacer(canon, "id"), text)
+    assert regex.sub(refpat.book_replacer(canon, "id"), text) == expected
+    timed(
+        "book_replacer, legacy",
+        args.n,
+        lambda: regex.sub(legacy_book_replacer(canon, "id"), text),
+    )
+    timed(
+        "book_replacer",
+        args.n,
+        lambda: regex.sub(refpat.book_replacer(canon, "id"), text),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Time encoding refs as verse ordinals and decoding them with bref.ordinals (NumPy)
+against Ref.key() / Ref.from_key() and Ref.ordinal() / Ref.from_ordinal(), one ref at a
+time, and check that they agree.
+
+    python benchmarks/ordinals.py [-n REFS] [--canon ESV]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons, ordinals  # noqa: E402
+from bref.ref import Ref  # noqa: E402
+
+
+def timed(label, count, func):
+    t = time.perf_counter()
+    result = func()
+    print(f"{label:28s} {(time.perf_counter() - t) / count * 1e9:10.1f} ns/ref")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=10000000, help="number of refs")
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    canon = canons[args.canon]
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, len(canon.index), args.n).astype(np.int32)
+    sample = values[: min(args.n, 100000)].tolist()
+    refs = [Ref.from_ordinal(o, canon) for o in sample]
+
+    keys = timed("Ref.key", len(refs), lambda: [ref.key() for ref in refs])
+    timed("Ref.from_key", len(keys), lambda: [Ref.from_key(k, canon) for k in keys])
+    timed("Ref.ordinal", len(refs), lambda: [ref.ordinal(canon) for ref in refs])
+    timed(
+        "Ref.from_ordinal",
+        len(sample),
+        lambda: [Ref.from_ordinal(o, canon) for o in sample],
+    )
+    assert ordinals.encode_refs(refs, canon).tolist() == sample
+    timed("ordinals.encode_refs", len(refs), lambda: ordinals.encode_refs(refs, canon))
+
+    ids, chs, vss = timed(
+        "ordinals.decode", args.n, lambda: ordinals.decode(values, canon)
+    )
+    encoded = timed(
+        "ordinals.encode", args.n, lambda: ordinals.encode(ids, chs, vss, canon)
+    )
+    assert (encoded == values).all()
+
+
+if __name__ == "__main__":
+    main()
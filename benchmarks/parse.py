@@ -0,0 +1,322 @@
+"""
+Time RefParser.parse() on typical reference strings against the string-state parser
+that the compiled lexer and integer state machine replaced, and check that the two give
+the same RefLists (or raise the same exceptions) on a corpus of reference strings and on
+random strings made of book names, numbers and separators, with and without a bk.
+
+    python benchmarks/parse.py [-n NUMBER] [--fuzz FUZZ] [--canon ESV ...]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons  # noqa: E402
+from bref.book import Book  # noqa: E402
+from bref.ref import Ref  # noqa: E402
+from bref.refparser import RefParser  # noqa: E402
+from bref.reflist import RefList  # noqa: E402
+from bref.refrange import RefRange  # noqa: E402
+
+STRINGS = [
+    "Matt.27.2,11-26,57-58,62-65; Mark.15.43-45",
+    "Gen 1:1-3; 2:4-7; Exod 20:1-17",
+    "Rom 8:28-39",
+    "John 3:16ff; Rom 8:28f, 30ff",
+    "1 Cor 13",
+    "Jude 3",
+    "Ps 119:105",
+    "Gen 50 - Exod 1",
+]
+CORPUS = STRINGS + [
+    "Gen",
+    "Gen-Exod",
+    "Gen 1-3",
+    "Gen 1:1-2:3",
+    "Gen 3:5-4:7; 5:8-10; Exod 3:2-Lev 4:5",
+    "Gen 50f",
+    "Gen 50:26f",
+    "Gen 1:31f; 2ff",
+    "Gen 3F",
+    "Ps 23 title",
+    "Ps 151",
+    "Ps 3, 4; 5:1-3",
+    "Jude 1",
+    "Jude 1-3",
+    "Jude 1:3-5",
+    "Jude 3, 5",
+    "Obad 1.1",
+    "Phlm 4-7; 3 John 2",
+    "2 John 1, 3 John 4",
+    "1 Kgs 22-23",
+    "1 Kgs 23:1",
+    "Rom 8:28-9:2, 5",
+    "Rom 8:28-Rom 9",
+    "Rom 8:28-1 Cor 2:3",
+    "Isa 40:31\nJer 29:11",
+    "chapter 3",
+    "Rev 21:1 - - 4 ;; 22:1,,5..",
+    "1-2 Kings",
+    "1,2Sam",
+    "3:16",
+    "16",
+    "not a ref",
+    "",
+]
+# the content and separators of the random strings
+PIECES = ["Gen", "Ps", "Jude", "Rom", "1 Cor", "Phlm", "3 John", "ch", "chap"] + [
+    str(n) for n in (0, 1, 2, 3, 5, 17, 50, 150, 151)
+]
+SEPARATORS = [".", ":", ",", ";", "-", " ", "f", "ff", "F"]
+BKS = [None, "Ps", "Jude", "Rom"]
+
+
+def legacy_parse(rp, refstring, bk=None):
+    """RefParser.parse() as it was before tokenize() and the integer state machine, on
+    the current parser's helpers, and with the book fields given to each Ref by
+    copy_book_fields() as the current parser does"""
+    refstring = rp.clean_input(refstring)
+
+    tokens = re.split(r"([.,;\-] ?)", refstring)  # sequence of tokens
+
+    # look for 'f' or 'ff' at the end of numeric tokens
+    for i in range(len(tokens) - 1, 0, -1):  # count backwards to avoid conflict
+        if re.match("^[0-9]+f$", tokens[i], re.I):
+            tokens[i] = re.sub("f", "", tokens[i], re.I)
+            tokens.insert(i + 1, "-")
+            tokens.insert(i + 2, "F")  # special token: get the next ch or vs number.
+        elif re.match("^[0-9]+ff$", tokens[i], re.I):
+            tokens[i] = re.sub("f", "", tokens[i], re.I)
+            tokens.insert(i + 1, "-")
+            tokens.insert(i + 2, "FF")  # special token: get the last ch or vs number.
+
+    # either bk is a parameter or the first token, or this is not a reference
+    if rp.match_book(tokens[0]) is None:
+        if bk is None:
+            return RefList()
+        else:  # bk is not None
+            trybook = rp.match_book(bk)
+            if trybook is not None:
+                # insert the book and sep at beginning of token list
+                tokens.insert(0, ".")
+                tokens.insert(0, trybook.name)
+
+    # initialize data
+    reflist = RefList()
+    crng = rp.create_range()
+    cref = crng[0]
+
+    # initial conditions
+    prev = None  # the type of the previous token
+    book = Book()
+    expect = "BOOK"  # start by looking for a book token
+
+    # state machine operates on each token and can access prev and next tokens
+    for i in range(len(tokens)):
+        token = tokens[i]
+
+        if token == ".":  # .
+            if prev == "BOOK":
+                # if one chapter book, expect ch or vs
+                if rp.chapters_in(book.name) == 1:
+                    expect = "CHORVS"
+                # otherwise, expect ch
+                else:
+                    expect = "CH"
+            elif prev == "CH":
+                expect = "VS"
+        elif re.match(
+            "^(?:ch|chap|chapter)?s?$", token, re.I
+        ):  # the word "chapter" or some form thereof
+            expect = "CH"
+        elif token in [
+            ";",
+            ",",
+        ]:  # ; or , -- slightly different, but some overlap as well
+            # add crng to reflist and initialize new range
+            rp.append_range(crng, reflist)
+
+            prevref = cref
+            crng = RefRange((Ref(), Ref()))
+            cref = crng[0]
+            cref.bk = prevref.bk
+            # if no previous token or previous token was a book, expect a book
+            if prev in [None, "BOOK"]:
+                expect = "BOOK"
+            # if the previous token was a ch, expect a book or a ch
+            elif prev == "CH":
+                expect = "BOOKORCH"
+            # if prev was a vs, depends on whether it's ; or ,
+            else:
+                if token == ",":
+                    expect = "VS"
+                    cref.ch = prevref.ch
+                if token == ";":
+                    expect = "BOOKORCH"
+        elif token == "-":  # -
+            # switch cref to crng[1]
+            cref = crng[1]
+            # if the previous token was a book, expect a book
+            if prev == "BOOK":
+                expect = "BOOK"
+            # if the previous token was a ch, expect a book or a ch
+            elif prev == "CH":
+                expect = "BOOKORCH"
+            # if the previous token was a vs, expect a ch or a vs (depends on following)
+            elif prev == "VS":
+                expect = "CHORVS"
+        else:  # content token
+            if expect == "BOOK":
+                # if the token matches a book, then assign it as the book for cref
+                trybook = rp.match_book(token)
+                if trybook is not None:
+                    book = trybook
+                    cref.bk = book.name
+                    cref.id = book.id
+                # otherwise, the book is null
+                prev = "BOOK"
+            elif expect == "BOOKORCH":
+                # if the token matches a book, then assign it as the book for cref
+                trybook = rp.match_book(token)
+                if trybook is not None:
+                    book = trybook
+                    rp.copy_book_fields(book.name, cref)
+                    cref.bk = book.name
+                    prev = "BOOK"
+                # otherwise, assign it as the chapter for the cref
+                else:
+                    if rp.chapters_in(crng[0].bk) == 1 and token != "1":
+                        cref.ch = "1"
+                        cref.vs = rp.get_vs(crng, token)
+                        prev = "VS"
+                    else:
+                        cref.ch = rp.get_ch(crng, token)
+                        prev = "CH"
+            elif expect == "CHORVS":
+                # either prev=='VS' followed by '-',
+                # or prev=='BOOK'
+                # set up following token
+                if i + 1 < len(tokens):
+                    following = tokens[i + 1]
+                else:
+                    following = None
+                # prev vs
+                if prev == "VS" and tokens[i - 1] == "-":
+                    trybook = rp.match_book(token)
+                    if trybook is not None:
+                        book = trybook
+                        rp.copy_book_fields(book.name, cref)
+                        cref.bk = book.name
+                        prev = "BOOK"
+                    elif following == ".":
+                        # the token is a ch
+                        cref.ch = rp.get_ch(crng, token)
+                        prev = "CH"
+                    else:
+                        # the token is a vs
+                        cref.vs = rp.get_vs(crng, token)
+                        prev = "VS"
+                # prev one ch book
+                elif prev == "BOOK":
+                    if rp.chapters_in(cref.bk) == 1:
+                        # it's a one-chapter book
+                        if token != "1":
+                            cref.vs = rp.get_vs(crng, token)
+                            prev = "VS"
+                        elif following == ".":
+                            cref.ch = rp.get_ch(crng, token)
+                            prev = "CH"
+                        elif following in ["-", ","]:
+                            cref.vs = rp.get_vs(crng, token)
+                            prev = "VS"
+                        else:
+                            cref.ch = rp.get_ch(crng, token)
+                            prev = "CH"
+                    else:
+                        # multi-chapter book, so this is a ch
+                        cref.ch = rp.get_ch(crng, token)
+                        prev = "CH"
+            elif expect == "CH":
+                # the token is a ch
+                cref.ch = rp.get_ch(crng, token)
+                prev = "CH"
+            elif expect == "VS":
+                trybook = rp.match_book(token)
+                if trybook is not None:
+                    # the token is a book! yes, it can happen
+                    book = trybook
+                    rp.copy_book_fields(book.name, cref)
+                    cref.bk = book.name
+                    cref.vs = cref.ch = None  # no ch assignment yet
+                    prev = "BOOK"
+                else:
+                    cref.vs = rp.get_vs(crng, token)
+                    prev = "VS"
+            # expect 'SEP' after a content token
+            expect = "SEP"
+
+    # close out last range
+    rp.append_range(crng, reflist)
+
+    return reflist
+
+
+def outcome(parse, rp, refstring, bk):
+    """what parse() gives: the repr of the RefList with the book record of each Ref, or
+    the type and message of the exception it raises"""
+    try:
+        reflist = parse(rp, refstring, bk=bk)
+    except Exception as exc:
+        return "%s: %s" % (type(exc).__name__, exc)
+    return repr(reflist), [[ref.book for ref in refrange] for refrange in reflist]
+
+
+def fuzz(count, seed=0):
+    rand = random.Random(seed)
+    strings = []
+    for _ in range(count):
+        parts = [rand.choice(PIECES)]
+        for _ in range(rand.randrange(5)):
+            parts += [rand.choice(SEPARATORS), rand.choice(PIECES[4:])]
+        strings.append("".join(parts))
+    return strings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", "--number", type=int, default=2000)
+    parser.add_argument(
+        "--fuzz", type=int, default=8000, help="random strings per canon"
+    )
+    parser.add_argument("--canon", nargs="+", default=["ESV", "NLT", "KJV", "NTV"])
+    args = parser.parse_args(argv)
+
+    strings = CORPUS + fuzz(args.fuzz)
+    for name in args.canon:
+        rp = RefParser(canons[name])
+        for refstring in strings:
+            for bk in BKS:
+                expected = outcome(legacy_parse, rp, refstring, bk)
+                current = outcome(RefParser.parse, rp, refstring, bk)
+                assert current == expected, (name, refstring, bk, current, expected)
+    print(
+        f"{len(CORPUS)} corpus strings and {args.fuzz} fuzz strings agree"
+        f" in {', '.join(args.canon)}, with bk in {BKS}"
+    )
+
+    rp = RefParser(canons[args.canon[0]])
+    for refstring in STRINGS:
+        legacy = timeit.timeit(lambda: legacy_parse(rp, refstring), number=args.number)
+        elapsed = timeit.timeit(lambda: rp.parse(refstring), number=args.number)
+        print(
+            f"{refstring:45s} {elapsed / args.number * 1e6:8.1f} us"
+            f"  (legacy {legacy / args.number * 1e6:8.1f} us)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure parsing throughput in strings per second: RefParser.parse() one string at a time,
+RefParser.parse_many() serially with a cold and a warm cache, and parse_many() with a
+process pool. All of them must give the same results.
+
+    python benchmarks/parse_many.py [-n STRINGS] [--unique FRACTION] [-w WORKERS]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons  # noqa: E402
+from bref.ref import Ref  # noqa: E402
+from bref.refparser import RefParser  # noqa: E402
+
+
+def corpus(canon, count, unique, seed=0):
+    """footnote-like reference strings, about unique * count of them distinct"""
+    rand = random.Random(seed)
+    total = len(canon.index)
+    distinct = []
+    for _ in range(max(1, int(count * unique))):
+        ref = Ref.from_ordinal(rand.randrange(total), canon)
+        form = rand.randrange(4)
+        if form == 0:
+            distinct.append("%s %d" % (ref.name, ref.ch))
+        elif form == 1:
+            distinct.append("%s %d:%d" % (ref.name, ref.ch, ref.vs))
+        elif form == 2:
+            distinct.append("%s %d:%d-%d" % (ref.name, ref.ch, ref.vs, ref.vs + 3))
+        else:
+            distinct.append("%s %d:%d; %d:1f" % (ref.name, ref.ch, ref.vs, ref.ch))
+    return [rand.choice(distinct) for _ in range(count)]
+
+
+def timed(label, count, func):
+    t = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - t
+    print(f"{label:24s} {count / elapsed:12.0f} strings/s")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=50000, help="number of strings")
+    parser.add_argument("--unique", type=float, default=0.2, help="fraction distinct")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    canon = canons[args.canon]
+    strings = corpus(canon, args.n, args.unique)
+
+    rp = RefParser(canon)
+    serial = timed("parse", args.n, lambda: [rp.parse(s) for s in strings])
+    cold = timed("parse_many (cold)", args.n, lambda: rp.parse_many(strings))
+    warm = timed("parse_many (warm)", args.n, lambda: rp.parse_many(strings))
+    rp = RefParser(canon)
+    pooled = timed(
+        "parse_many (%d workers)" % args.workers,
+        args.n,
+        lambda: rp.parse_many(strings, workers=args.workers),
+    )
+    expected = [repr(r) for r in serial]
+    for results in [cold, warm, pooled]:
+        assert [repr(r) for r in results] == expected, "results differ from parse()"
+
+
+if __name__ == "__main__":
+    main()
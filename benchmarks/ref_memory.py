@@ -0,0 +1,83 @@
+"""
+Measure the memory taken by a corpus of parsed references (100k ranges by default), and
+the size and time of pickling it, as RefParser.parse_many() does to send results from
+its worker processes: all at once, and one RefList at a time.
+
+    python benchmarks/ref_memory.py [-n RANGES] [--canon ESV]
+"""
+import argparse
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons  # noqa: E402
+from bref.ref import Ref  # noqa: E402
+from bref.refparser import RefParser  # noqa: E402
+
+
+def refstrings(canon, ranges, seed=0):
+    """reference strings of one to five ranges each, with ranges ranges altogether"""
+    rand = random.Random(seed)
+    total = len(canon.index)
+    result = []
+    count = 0
+    while count < ranges:
+        parts = []
+        for _ in range(min(rand.randrange(1, 6), ranges - count)):
+            a = Ref.from_ordinal(rand.randrange(total), canon)
+            b = Ref.from_ordinal(min(total - 1, a.ordinal(canon) + 40), canon)
+            parts.append(
+                rand.choice(
+                    [
+                        "%s %d:%d" % (a.name, a.ch, a.vs),
+                        "%s %d" % (a.name, a.ch),
+                        "%s %d:%d-%d" % (a.name, a.ch, a.vs, a.vs + 2),
+                        "%s %d:%d-%s %d:%d" % (a.name, a.ch, a.vs, b.name, b.ch, b.vs),
+                    ]
+                )
+            )
+        count += len(parts)
+        result.append("; ".join(parts))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=100000, help="number of ranges")
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    rp = RefParser(canons[args.canon])
+    strings = refstrings(rp.canon, args.n)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    reflists = [rp.parse(s) for s in strings]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    ranges = sum(len(reflist) for reflist in reflists)
+    print(f"{ranges} ranges: {size / 1e6:.1f} MB, {size / ranges:.0f} bytes/range")
+
+    t = time.perf_counter()
+    data = pickle.dumps(reflists, protocol=pickle.HIGHEST_PROTOCOL)
+    print(
+        f"pickled at once: {len(data) / 1e6:.1f} MB in {time.perf_counter() - t:.2f} s"
+    )
+    t = time.perf_counter()
+    data = [pickle.dumps(r, protocol=pickle.HIGHEST_PROTOCOL) for r in reflists]
+    print(
+        f"pickled one at a time: {sum(map(len, data)) / 1e6:.1f} MB"
+        f" in {time.perf_counter() - t:.2f} s"
+    )
+    t = time.perf_counter()
+    for d in data:
+        pickle.loads(d)
+    print(f"unpickled one at a time in {time.perf_counter() - t:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare RefIndex overlap queries with a linear scan over the same ranges, and check that
+they agree.
+
+    python benchmarks/refindex.py [-n RANGES] [-q QUERIES] [--canon ESV]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons  # noqa: E402
+from bref.ref import Ref  # noqa: E402
+from bref.refindex import RefIndex  # noqa: E402
+from bref.refrange import RefRange  # noqa: E402
+
+
+def random_ranges(canon, count, seed=0):
+    """ranges of mostly a few verses, some of a chapter or more, anywhere in the canon"""
+    rand = random.Random(seed)
+    total = len(canon.index)
+    ranges = []
+    for _ in range(count):
+        start = rand.randrange(total)
+        length = rand.choice([1, 1, 3, 10, 25, 100, 1000])
+        end = min(start + rand.randrange(length), total - 1)
+        ranges.append(
+            RefRange((Ref.from_ordinal(start, canon), Ref.from_ordinal(end, canon)))
+        )
+    return ranges
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=200000, help="number of ranges")
+    parser.add_argument("-q", type=int, default=200, help="number of queries")
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    canon = canons[args.canon]
+
+    ranges = random_ranges(canon, args.n)
+    queries = random_ranges(canon, args.q, seed=1)
+
+    t = time.perf_counter()
+    refindex = RefIndex(canon, ((r, i) for i, r in enumerate(ranges)))
+    refindex.index()
+    build_time = time.perf_counter() - t
+
+    # the linear scan gets the ordinals for free, so it measures the scan alone
+    pairs = [r.ordinals(canon) for r in ranges]
+    t = time.perf_counter()
+    linear = [
+        sorted(i for i, (s, e) in enumerate(pairs) if s <= qe and e >= qs)
+        for qs, qe in (q.ordinals(canon) for q in queries)
+    ]
+    linear_time = time.perf_counter() - t
+
+    t = time.perf_counter()
+    indexed = [sorted(refindex.overlapping(q)) for q in queries]
+    indexed_time = time.perf_counter() - t
+
+    assert indexed == linear, "RefIndex and the linear scan disagree"
+    hits = sum(len(r) for r in indexed)
+    print(f"{args.n} ranges, {args.q} queries, {hits} hits")
+    print(f"build:   {build_time * 1000:10.1f} ms")
+    print(f"linear:  {linear_time / args.q * 1e6:10.1f} us/query")
+    print(f"indexed: {indexed_time / args.q * 1e6:10.1f} us/query")
+
+
+if __name__ == "__main__":
+    main()
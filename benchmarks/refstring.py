@@ -0,0 +1,69 @@
+"""
+Time RefParser.refstring(), which builds the refstring directly with format_refstring(),
+against clean_refstring(format()), which it used to be, and check that both give the same
+refstrings.
+
+    python benchmarks/refstring.py [-n REFLISTS] [--canon ESV]
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons  # noqa: E402
+from bref.ref import Ref  # noqa: E402
+from bref.refparser import RefParser  # noqa: E402
+
+
+def reflists(rp, count, seed=0):
+    """parsed references of one to four ranges, some across chapters and books"""
+    rand = random.Random(seed)
+    total = len(rp.canon.index)
+    result = []
+    while len(result) < count:
+        parts = []
+        for _ in range(rand.randrange(1, 5)):
+            a = Ref.from_ordinal(rand.randrange(total), rp.canon)
+            b = Ref.from_ordinal(
+                min(total - 1, a.ordinal(rp.canon) + rand.choice([0, 2, 40, 2000])),
+                rp.canon,
+            )
+            parts.append(
+                "%s %d:%d-%s %d:%d%s"
+                % (a.name, a.ch, a.vs, b.name, b.ch, b.vs, rand.choice(["", "a"]))
+            )
+        result.append(rp.parse("; ".join(parts)))
+    return result
+
+
+def timed(label, count, func):
+    t = time.perf_counter()
+    result = func()
+    print(f"{label:32s} {(time.perf_counter() - t) / count * 1e6:8.2f} µs/reflist")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=20000, help="number of reflists")
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    rp = RefParser(canons[args.canon])
+    refs = reflists(rp, args.n)
+    legacy_refs = copy.deepcopy(refs)  # format() changes the refs
+
+    legacy = timed(
+        "clean_refstring(format())",
+        args.n,
+        lambda: [rp.clean_refstring(rp.format(r)) for r in legacy_refs],
+    )
+    current = timed("refstring", args.n, lambda: [rp.refstring(r) for r in refs])
+    assert current == legacy, "refstrings differ"
+
+
+if __name__ == "__main__":
+    main()
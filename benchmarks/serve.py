@@ -0,0 +1,79 @@
+"""
+Measure bref-serve throughput in requests per second, piping JSON-lines requests into a
+bref-serve process, and check that every line it writes to stdout is a JSON response to
+one of the requests: nothing else, such as a parser error message, may be written there.
+
+    python benchmarks/serve.py [-n REQUESTS] [--canon ESV]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# texts and refstrings with refs that do not parse (no such chapter) as well as good ones
+TEXTS = [
+    "See Gen 51:3 and Gen 1:1.",
+    "Compare John 3:16 with 1 John 4:9-10; Rom 5:8.",
+    "Ps 151 is not in every canon, Ps 23 is.",
+    "Nothing to see here.",
+]
+REFSTRINGS = ["Gen 1:1-3", "1 Kgs 22-23", "Gen 50:26f", "Rom", "not a ref"]
+BAD_LINES = ["[1, 2]", "null", "{not json", '{"id": -1, "method": "nope"}']
+
+
+def requests(count, seed=0):
+    """count JSON-lines requests with ids 0 to count - 1, a few lines that are not valid
+    requests (three of which get responses with "id": null), and a stats request"""
+    rand = random.Random(seed)
+    lines = []
+    for request_id in range(count):
+        if rand.randrange(2):
+            method, params = "tag_refs_in_text", {"text": rand.choice(TEXTS)}
+        else:
+            method, params = "parse", {"refstring": rand.choice(REFSTRINGS)}
+        lines.append(json.dumps({"id": request_id, "method": method, "params": params}))
+    lines += BAD_LINES
+    lines.append(json.dumps({"id": count, "method": "stats"}))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=2000, help="number of requests")
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    lines = requests(args.n)
+
+    t = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-c", "from bref.cli import serve; serve()", "-c", args.canon],
+        input="\n".join(lines) + "\n",
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        check=True,
+    )
+    elapsed = time.perf_counter() - t
+
+    output = process.stdout.splitlines()
+    responses = []
+    for line in output:
+        try:
+            responses.append(json.loads(line))
+        except ValueError:
+            raise AssertionError("not a JSON line on stdout: %r" % line)
+    assert len(responses) == len(lines), (len(responses), len(lines))
+    ids = [response["id"] for response in responses]
+    assert ids.count(None) == 3, ids.count(None)
+    assert sorted(i for i in ids if i is not None) == list(range(-1, args.n + 1))
+    print(f"{len(lines)} requests, {len(output)} JSON responses")
+    print(f"bref-serve: {len(lines) / elapsed:10.0f} requests/s (with startup)")
+
+
+if __name__ == "__main__":
+    main()
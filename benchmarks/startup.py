@@ -0,0 +1,74 @@
+"""
+Measure the time and memory that `import bref` costs a fresh interpreter, and the cost
+of the first access to a canon.
+
+    python benchmarks/startup.py [-n RUNS] [--canon ESV]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# tracemalloc slows imports down, so time and memory are measured in separate runs
+PROBE = """
+import json, resource, time, tracemalloc
+if %(trace)r:
+    tracemalloc.start()
+t = time.perf_counter()
+import bref
+import_time = time.perf_counter() - t
+import_mem = tracemalloc.get_traced_memory()[1]
+t = time.perf_counter()
+bref.canons[%(canon)r]
+canon_time = time.perf_counter() - t
+canon_mem = tracemalloc.get_traced_memory()[1]
+print(json.dumps({
+    "import_time": import_time,
+    "import_mem": import_mem,
+    "canon_time": canon_time,
+    "canon_mem": canon_mem,
+    "maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def run(canon, trace=False):
+    output = subprocess.check_output(
+        [sys.executable, "-c", PROBE % {"canon": canon, "trace": trace}],
+        cwd=PACKAGE_PATH,
+    )
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", "--runs", type=int, default=10)
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+
+    runs = [run(args.canon) for _ in range(args.runs)]
+    traced = [run(args.canon, trace=True) for _ in range(args.runs)]
+    print("runs: %d" % len(runs))
+    print(
+        "import bref:        %8.1f ms (median)  %8.1f KiB peak traced"
+        % (
+            statistics.median(r["import_time"] for r in runs) * 1000,
+            max(r["import_mem"] for r in traced) / 1024,
+        )
+    )
+    print(
+        "first canon access: %8.1f ms (median)  %8.1f KiB peak traced"
+        % (
+            statistics.median(r["canon_time"] for r in runs) * 1000,
+            max(r["canon_mem"] for r in traced) / 1024,
+        )
+    )
+    print("max RSS:            %8.1f MiB" % (max(r["maxrss"] for r in runs) / 1024))
+
+
+if __name__ == "__main__":
+    main()
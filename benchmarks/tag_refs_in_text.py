@@ -0,0 +1,119 @@
+"""
+Time refpat.tag_refs_in_text() against the implementation that it replaced, which ran
+re.sub() over the whole text for each pattern and repeated it for the repeating patterns
+until the text stopped changing, and check that the two tag the same references.
+Paragraphs of chained references ("Gen 1:1; 5; 7; ...") took quadratic time.
+
+    python benchmarks/tag_refs_in_text.py [-n PARAGRAPHS] [--chain LENGTH] [--canon ESV]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons, refpat  # noqa: E402
+from bref.ref import Ref  # noqa: E402
+from bref.refparser import RefParser  # noqa: E402
+
+WORDS = (
+    "and the Lord said unto him after 3 days 12 men went up; see also chapter".split()
+)
+
+
+def legacy_tag_refs_in_text(text, patterns, refparser=None, bk=None):
+    def repl_bref(md):
+        txt = md.group(1)
+        if refparser is not None:
+            try:
+                refstr = refparser.refstring(refparser.parse(txt, bk=bk))
+            except Exception:
+                return txt
+            tagged = """<ref name="%s">%s</ref>""" % (refstr, txt)
+        else:
+            tagged = """<ref>%s</ref>""" % (txt,)
+        return tagged
+
+    for regex in patterns["regexs"]:
+        if patterns["regexs"].index(regex) in patterns["repeating"]:
+            t = re.sub(regex, repl_bref, text)
+            while t != text:
+                text = t
+                t = re.sub(regex, repl_bref, text)
+        else:
+            text = re.sub(regex, repl_bref, text)
+
+    return text
+
+
+def paragraphs(canon, count, seed=0):
+    rand = random.Random(seed)
+    total = len(canon.index)
+    result = []
+    for _ in range(count):
+        words = []
+        for _ in range(rand.randrange(1, 6)):
+            r = Ref.from_ordinal(rand.randrange(total), canon)
+            words += rand.sample(WORDS, rand.randrange(8))
+            words.append(
+                rand.choice(
+                    [
+                        "%s %d" % (r.name, r.ch),
+                        "%s %d:%d" % (r.name, r.ch, r.vs),
+                        "%s %d:%d-%d; %d:1" % (r.name, r.ch, r.vs, r.vs + 2, r.ch),
+                        "%s %d:%d, %d" % (r.name, r.ch, r.vs, r.vs + 3),
+                        "chapters %d, %d" % (r.ch, r.ch + 1),
+                    ]
+                )
+            )
+        result.append(" ".join(words))
+    return result
+
+
+def chains(length):
+    """a forward and a backward chain of chapter references"""
+    numbers = "; ".join(str(n) for n in range(2, length + 2))
+    return ["See Gen 1:1; %s." % numbers, "See %s; Gen 1:1." % numbers]
+
+
+def timed(label, count, func):
+    t = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - t
+    print(f"{label:32s} {elapsed / count * 1e3:10.3f} ms/text")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=500, help="number of paragraphs")
+    parser.add_argument("--chain", type=int, default=50, help="chained refs")
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    canon = canons[args.canon]
+    rp = RefParser(canon)
+    patterns = refpat.make_patterns(canon)
+
+    for label, texts in [
+        ("%d paragraphs" % args.n, paragraphs(canon, args.n)),
+        ("chains of %d" % args.chain, chains(args.chain)),
+    ]:
+        print(label)
+        legacy = timed(
+            "  legacy",
+            len(texts),
+            lambda: [legacy_tag_refs_in_text(t, patterns, refparser=rp) for t in texts],
+        )
+        current = timed(
+            "  tag_refs_in_text",
+            len(texts),
+            lambda: [refpat.tag_refs_in_text(t, patterns, refparser=rp) for t in texts],
+        )
+        assert current == legacy, "tagged texts differ"
+
+
+if __name__ == "__main__":
+    main()
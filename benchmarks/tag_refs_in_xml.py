@@ -0,0 +1,131 @@
+"""
+Time refpat.tag_refs_in_xml() against the implementation that it replaced, which
+serialized the document, un-escaped the <ref> tags with a regex and parsed it again, and
+check that the two give the same document. Tagging the text dominates both, so they are
+also timed with find_refs_in_text() memoized, which leaves only the work on the XML.
+
+    python benchmarks/tag_refs_in_xml.py [-n PARAGRAPHS] [--canon ESV]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+from bxml import XML
+from lxml import etree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bref import canons, refpat  # noqa: E402
+from bref.ref import Ref  # noqa: E402
+from bref.refparser import RefParser  # noqa: E402
+
+WORDS = "and the Lord said unto him &amp; after 3 days 12 men went up".split()
+
+
+def legacy_tag_refs_in_xml(
+    x, patterns, xpath=None, namespaces=None, refparser=None, bk=None
+):
+    if xpath is None:
+        elements = x.xpath(x.root, "//*")
+    else:
+        elements = x.xpath(x.root, xpath, namespaces=namespaces)
+    for element in elements:
+        if element.text is not None and element.get("href") is None:
+            element.text = refpat.tag_refs_in_text(
+                element.text, patterns, refparser=refparser, bk=bk
+            )
+        if element.tail is not None:
+            element.tail = refpat.tag_refs_in_text(
+                element.tail, patterns, refparser=refparser, bk=bk
+            )
+    t = re.sub("&lt;(ref[^&>]+)&gt;", r"<\1>", x.tostring()).replace(
+        "&lt;/ref&gt;", "</ref>"
+    )
+    x.root = x.fromstring(t)
+    return x
+
+
+def document(canon, paragraphs, seed=0):
+    """a namespaced document of paragraphs of words, refs and inline elements"""
+    rand = random.Random(seed)
+    total = len(canon.index)
+
+    def ref():
+        r = Ref.from_ordinal(rand.randrange(total), canon)
+        return rand.choice(
+            [
+                "%s %d" % (r.name, r.ch),
+                "%s %d:%d" % (r.name, r.ch, r.vs),
+                "%s %d:%d-%d; %d:1" % (r.name, r.ch, r.vs, r.vs + 2, r.ch),
+                "%s %d:%d, %d" % (r.name, r.ch, r.vs, r.vs + 3),
+            ]
+        )
+
+    out = ['<doc xmlns="urn:bref:test">']
+    for i in range(paragraphs):
+        out.append('<p id="p%d">' % i)
+        for _ in range(rand.randrange(1, 5)):
+            out.append(
+                " ".join(rand.sample(WORDS, rand.randrange(8))) + " " + ref() + " "
+            )
+            out.append(
+                rand.choice(
+                    ['<a href="#x">%s</a>', "<i>%s</i>", "<b><i>%s</i> %s</b>"]
+                ).replace("%s", ref())
+            )
+        out.append("</p>\n")
+    out.append("</doc>")
+    return "".join(out).encode("utf-8")
+
+
+def timed(label, func):
+    t = time.perf_counter()
+    result = func()
+    print(f"{label:16s} {time.perf_counter() - t:8.2f} s")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("-n", type=int, default=2000, help="number of paragraphs")
+    parser.add_argument("--canon", default="ESV")
+    args = parser.parse_args(argv)
+    canon = canons[args.canon]
+    rp = RefParser(canon)
+    patterns = refpat.make_patterns(canon)
+    data = document(canon, args.n)
+    print(f"{len(data) / 1e6:.1f} MB, {args.n} paragraphs")
+
+    def run():
+        x = XML(root=etree.fromstring(data))
+        legacy = timed(
+            "legacy", lambda: legacy_tag_refs_in_xml(x, patterns, refparser=rp)
+        )
+        x = XML(root=etree.fromstring(data))
+        current = timed(
+            "tag_refs_in_xml",
+            lambda: refpat.tag_refs_in_xml(x, patterns, refparser=rp),
+        )
+        assert etree.tostring(current.root) == etree.tostring(legacy.root), "differ"
+
+    run()
+    find_refs_in_text, memo = refpat.find_refs_in_text, {}
+
+    def memoized(text, patterns, refparser=None, bk=None, stats=None):
+        if text not in memo:
+            memo[text] = find_refs_in_text(
+                text, patterns, refparser=refparser, bk=bk, stats=stats
+            )
+        return memo[text]
+
+    refpat.find_refs_in_text = memoized
+    legacy_tag_refs_in_xml(XML(root=etree.fromstring(data)), patterns, refparser=rp)
+    print("memoized find_refs_in_text:")
+    run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Tag the references in many XML files at once (see refpat.tag_refs_in_xml). The files are
+tagged in a pool of processes, each of which loads the canon, a RefParser and the compiled
+patterns once. Each result is written to a temporary file beside its destination and
+renamed over it, so a destination is never left half-written, even when it is the source.
+"""
+import glob
+import os
+import stat
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from bl.dict import Dict
+from bxml import XML
+
+from . import refpat
+from .canon import Canon
+from .refparser import RefParser
+
+
+def expand_paths(paths):
+    """the files named by paths (a path or glob pattern, or a list of them), in order and
+    without duplicates; glob patterns are expanded recursively, so "docs/**/*.xml" works.
+    """
+    return list(expand_paths_with_roots(paths))
+
+
+def expand_paths_with_roots(paths):
+    """{file: root} for the files named by paths, as in expand_paths(), where root is the
+    directory of the glob pattern before its first wildcard (the file's own directory for
+    a path without one)"""
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    files = {}
+    for path in map(str, paths):
+        if glob.has_magic(path):
+            parts = Path(path).parts
+            fixed = next(i for i, part in enumerate(parts) if glob.has_magic(part))
+            root = str(Path(*parts[:fixed])) if fixed > 0 else ""
+            for file in sorted(glob.glob(path, recursive=True)):
+                files.setdefault(file, root)
+        else:
+            files.setdefault(path, os.path.dirname(path))
+    return files
+
+
+def destinations(paths, outdir=None):
+    """
+    The (src, dest) of each file named by paths (see expand_paths()). dest is src itself
+    if outdir is None; otherwise it is src's path relative to its root (see
+    expand_paths_with_roots()) under outdir, so that "docs/**/*.xml" keeps the directories
+    below docs. Raises ValueError if two files would be written to the same dest.
+    """
+    pairs = []
+    sources = {}
+    for src, root in expand_paths_with_roots(paths).items():
+        if outdir is None:
+            dest = src
+        else:
+            dest = str(Path(outdir) / os.path.relpath(src, root or os.curdir))
+        key = os.path.normcase(os.path.abspath(dest))
+        if key in sources:
+            raise ValueError(
+                "%s and %s would both be written to %s" % (sources[key], src, dest)
+            )
+        sources[key] = src
+        pairs.append((src, dest))
+    return pairs
+
+
+def write_atomically(dest, write):
+    """Call write(f) with a binary file that is renamed to dest when write() returns, so
+    that dest is never partly written. The file keeps the permissions of an existing dest.
+    """
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tempfn = tempfile.mkstemp(dir=dest.parent, prefix=dest.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        try:
+            mode = stat.S_IMODE(dest.stat().st_mode)
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tempfn, mode)
+        os.replace(tempfn, dest)
+    except BaseException:
+        os.unlink(tempfn)
+        raise
+
+
+def tag_files(
+    paths,
+    canon,
+    outdir=None,
+    workers=None,
+    xpath=None,
+    namespaces=None,
+    bk=None,
+    stream=False,
+    report=None,
+):
+    """
+    Tag the references in the XML files named by paths (see expand_paths()) with canon (a
+    Canon or the name of one), writing each result over the file itself if outdir is
+    None, or else under outdir with its path relative to its glob pattern (see
+    destinations(), which raises ValueError before any file is tagged if two files would
+    be written to the same place). xpath, namespaces and bk are passed on to
+    refpat.tag_refs_in_xml(); with stream=True, tag_refs_in_xml_stream() is used instead,
+    which keeps memory use bounded for very large files but tags every element.
+
+    The files are tagged in a ProcessPoolExecutor with workers processes (default,
+    os.cpu_count()), or in this process if workers == 1. Returns a list of results in the
+    order of the files, each a Dict(src, dest, size, seconds, error), where error is None
+    or the message of the exception that stopped the file from being tagged; other files
+    are tagged regardless. report(result) is called with each result as it is ready.
+    """
+    if stream and xpath is not None:
+        raise ValueError("xpath cannot be used with stream=True")
+    tasks = [
+        (src, dest, xpath, namespaces, bk, stream)
+        for src, dest in destinations(paths, outdir=outdir)
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    results = []
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(canon,)
+        ) as executor:
+            for result in executor.map(tag_file_in_worker, tasks):
+                results.append(result)
+                if report is not None:
+                    report(result)
+    else:
+        init_worker(canon)
+        for task in tasks:
+            results.append(tag_file_in_worker(task))
+            if report is not None:
+                report(results[-1])
+    return results
+
+
+def summary(results, seconds):
+    """a one-line summary of the results of tag_files(), which took seconds altogether"""
+    size = sum(result.size for result in results)
+    errors = sum(1 for result in results if result.error is not None)
+    seconds = max(seconds, 1e-9)
+    return "%d files (%d failed), %.1f MB in %.2f s: %.1f files/s, %.2f MB/s" % (
+        len(results),
+        errors,
+        size / 1e6,
+        seconds,
+        len(results) / seconds,
+        size / 1e6 / seconds,
+    )
+
+
+# the (refparser, patterns) in each worker process of tag_files()
+WORKER = None
+
+
+def init_worker(canon):
+    global WORKER
+    if isinstance(canon, str):
+        canon = Canon.load_by_name(canon)
+    WORKER = (RefParser(canon), refpat.make_patterns(canon))
+
+
+def tag_file_in_worker(task):
+    src, dest, xpath, namespaces, bk, stream = task
+    refparser, patterns = WORKER
+    result = Dict(src=src, dest=dest, size=0, seconds=0.0, error=None)
+    t = time.perf_counter()
+    try:
+        result.size = os.path.getsize(src)
+        if stream:
+            write_atomically(
+                dest,
+                lambda f: refpat.tag_refs_in_xml_stream(
+                    src, f, patterns, refparser=refparser, bk=bk
+                ),
+            )
+        else:
+            x = XML(fn=src)
+            refpat.tag_refs_in_xml(
+                x,
+                patterns,
+                xpath=xpath,
+                namespaces=namespaces,
+                refparser=refparser,
+                bk=bk,
+            )
+            data = x.tobytes(canonicalized=False, pretty_print=False)
+            write_atomically(dest, lambda f: f.write(data))
+    except Exception as exc:
+        result.error = "%s: %s" % (type(exc).__name__, exc)
+    result.seconds = time.perf_counter() - t
+    return result
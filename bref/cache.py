@@ -0,0 +1,100 @@
+"""
+Compiled canons: a Canon built from a canon XML file is pickled into a cache directory, so
+that later processes can load it without parsing the XML. A compiled canon is used while
+its source file is unchanged (same mtime and size, or failing that, the same sha1); when
+the source changes, the canon is rebuilt from the XML and the cache file is rewritten.
+
+The cache directory is $BREF_CACHE_DIR, or $XDG_CACHE_HOME/bref, or ~/.cache/bref.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+LOG = logging.getLogger(__name__)
+
+# Bump FORMAT_VERSION whenever the pickled structure of Canon or Book changes, so that
+# compiled canons from older versions of bref are ignored rather than misread.
+FORMAT_VERSION = 2
+
+
+def cache_dir():
+    """the directory in which compiled canons are stored"""
+    if os.environ.get("BREF_CACHE_DIR"):
+        return Path(os.environ["BREF_CACHE_DIR"])
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "bref"
+
+
+def cache_path(src, dirpath=None):
+    """the path of the compiled file for the given source file"""
+    src = Path(src).absolute()
+    srckey = hashlib.sha1(str(src).encode("utf-8")).hexdigest()[:8]
+    return (
+        Path(dirpath or cache_dir()) / f"{src.stem}-{srckey}.v{FORMAT_VERSION}.pickle"
+    )
+
+
+def digest(src):
+    """the sha1 hexdigest of the source file"""
+    with open(src, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load(src, build, dirpath=None):
+    """Return the object compiled from src: from the cache if it is current, otherwise
+    from build(src), which is then stored in the cache.
+    """
+    src = Path(src)
+    path = cache_path(src, dirpath)
+    stat = src.stat()
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            if header[:3] == (FORMAT_VERSION, stat.st_mtime_ns, stat.st_size):
+                return pickle.load(f)
+            srcdigest = digest(src)
+            if header[:1] == (FORMAT_VERSION,) and header[3] == srcdigest:
+                # touched but not changed: keep the compiled object, refresh the header
+                obj = pickle.load(f)
+                store(src, obj, dirpath=dirpath, srcdigest=srcdigest)
+                return obj
+    except FileNotFoundError:
+        pass
+    except Exception as exc:
+        LOG.warning("ignoring unreadable compiled file %s: %s", path, exc)
+    return rebuild(src, build, dirpath=dirpath)[0]
+
+
+def rebuild(src, build, dirpath=None):
+    """Build the object from src and store it in the cache. Returns (obj, path), where
+    path is None if the cache could not be written.
+    """
+    obj = build(str(src))
+    return obj, store(src, obj, dirpath=dirpath)
+
+
+def store(src, obj, dirpath=None, srcdigest=None):
+    """Store obj as the compiled form of src, replacing the cache file atomically.
+    Returns the path of the cache file, or None if it could not be written.
+    """
+    src = Path(src)
+    path = cache_path(src, dirpath)
+    stat = src.stat()
+    header = (FORMAT_VERSION, stat.st_mtime_ns, stat.st_size, srcdigest or digest(src))
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tempfn = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tempfn, path)
+        except BaseException:
+            os.unlink(tempfn)
+            raise
+    except OSError as exc:
+        LOG.debug("could not write compiled file %s: %s", path, exc)
+        return None
+    return path
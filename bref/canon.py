@@ -1,23 +1,53 @@
+from collections.abc import Mapping
 from pathlib import Path
+
 from bl.dict import Dict
 from bxml import XML
 from bxml.builder import Builder
 
+from . import cache
 from .book import Book
+from .canonindex import CanonIndex
 from .ns import NS
 
 CANONS_PATH = Path(__file__).absolute().parent.parent / 'bref' / 'resources' / 'canons'
 
+# canons that have been loaded by name, shared by Canon.load_by_name() and bref.canons
+LOADED = {}
+
 
 class Canon(Dict):
     def __repr__(self):
         return "Canon(name='%(name)s', lang='%(lang)s')" % self
 
+    def __getstate__(self):
+        # derived values are rebuilt when they are needed, not pickled (see bref.cache).
+        # None when there is nothing else: Dict.__getattr__ would answer a lookup of
+        # __setstate__ with None, so there must be no state to set.
+        state = {k: v for k, v in self.__dict__.items() if k != "derived_values"}
+        return state or None
+
+    def derived(self, name, key, build):
+        """Return a value derived from the canon, such as its compiled reference patterns,
+        calling build() for it the first time and again whenever key changes. The key
+        should capture what the value depends on (e.g., the book patterns), so that the
+        value is rebuilt if the books are edited. Derived values are not items of the
+        canon, so they are not pickled with it.
+        """
+        values = self.__dict__.setdefault("derived_values", {})
+        if name not in values or values[name][0] != key:
+            values[name] = (key, build())
+        return values[name][1]
+
     @classmethod
     def load_by_name(cls, name):
-        filepath = CANONS_PATH / f"{name}-canon.xml"
-        xml = XML(fn=str(filepath))
-        return cls.from_xml(xml)
+        """load the named canon from resources/canons, once per process, using the
+        compiled canon in the cache directory when it is current (see bref.cache).
+        """
+        if name not in LOADED:
+            filepath = CANONS_PATH / f"{name}-canon.xml"
+            LOADED[name] = cache.load(filepath, cls.from_xml)
+        return LOADED[name]
 
     @classmethod
     def from_xml(cls, xml):
@@ -32,6 +62,7 @@ class Canon(Dict):
                 for book in xml.root.getchildren()
             ],
         )
+        canon.index = CanonIndex(canon.books)
         return canon
 
     def to_xml(self, fn=None, config=None):
@@ -44,6 +75,37 @@ class Canon(Dict):
         return x
 
 
+class Canons(Mapping):
+    """The canons in resources/canons, by name. Each canon is parsed on first access
+    (through Canon.load_by_name), so importing bref doesn't parse every canon file.
+    Like bl.dict.Dict, canons can be accessed as attributes: bref.canons.ESV
+    """
+
+    def __init__(self, path=CANONS_PATH):
+        self.names = sorted(fn.name.split("-")[0] for fn in Path(path).glob("*.xml"))
+
+    def __repr__(self):
+        return "Canons(%s)" % ", ".join(self.names)
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        return Canon.load_by_name(name)
+
+    def __getattr__(self, name):
+        if name in self.__dict__.get("names", ()):
+            return self[name]
+        elif name.startswith("__"):
+            raise AttributeError(name)
+        # like bl.dict.Dict, return None if the canon is not found.
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
 if __name__ == "__main__":
     import doctest
 
@@ -0,0 +1,126 @@
+from array import array
+from bisect import bisect_right
+
+
+class CanonIndex:
+    """Compact verse-count tables for a canon, built once when the canon is loaded.
+
+    * book_positions: book id -> position of the book in the canon
+    * chapter_counts: the number of chapters in each book, by position
+    * chapter_offsets: the flat chapter index of the first chapter of each book, by
+        position (one extra entry at the end: the total number of chapters)
+    * verse_counts: the number of verses in each chapter, flat across the canon
+    * verse_offsets: the ordinal of the first verse of each chapter, flat across the
+        canon (one extra entry at the end: the total number of verses)
+
+    A verse ordinal is the 0-based position of a verse in the whole canon, so Gen 1:1
+    is 0 and the last verse of the canon is len(index) - 1. Ordinals are computed with
+    chapter and verse clamped to the book and chapter, so verse 0 (a title) has the same
+    ordinal as verse 1.
+    """
+
+    __slots__ = (
+        "book_ids",
+        "book_positions",
+        "chapter_counts",
+        "chapter_offsets",
+        "verse_counts",
+        "verse_offsets",
+    )
+
+    def __init__(self, books):
+        self.book_ids = array("H")
+        self.book_positions = {}
+        self.chapter_counts = array("H")
+        self.chapter_offsets = array("L", [0])
+        self.verse_counts = array("H")
+        self.verse_offsets = array("L", [0])
+        for position, book in enumerate(books):
+            self.book_ids.append(int(book.id))
+            self.book_positions[int(book.id)] = position
+            self.chapter_counts.append(len(book.chapters))
+            self.chapter_offsets.append(self.chapter_offsets[-1] + len(book.chapters))
+            for chapter in book.chapters:
+                self.verse_counts.append(int(chapter.vss))
+                self.verse_offsets.append(self.verse_offsets[-1] + int(chapter.vss))
+
+    def __len__(self):
+        """the number of verses in the canon"""
+        return self.verse_offsets[-1]
+
+    def chapters_in(self, book_id):
+        """the number of chapters in the given book"""
+        return self.chapter_counts[self.book_positions[int(book_id)]]
+
+    def verses_in(self, book_id, ch):
+        """the number of verses in the given book and chapter, 0 if there is no such
+        chapter
+
+        >>> from bref import canons
+        >>> [canons.ESV.index.verses_in(11, ch) for ch in (1, 22, 23, 0)]  # 1 Kings
+        [53, 53, 0, 0]
+        """
+        position = self.book_positions[int(book_id)]
+        ch = int(ch)
+        if ch < 1 or ch > self.chapter_counts[position]:
+            return 0
+        return self.verse_counts[self.chapter_offsets[position] + ch - 1]
+
+    def ordinal(self, book_id, ch, vs):
+        """the verse ordinal of the given book, chapter and verse"""
+        position = self.book_positions[int(book_id)]
+        chapters = self.chapter_counts[position]
+        if chapters == 0:
+            raise ValueError("book %r has no chapters" % book_id)
+        index = self.chapter_offsets[position] + min(max(int(ch), 1), chapters) - 1
+        vs = min(max(int(vs), 1), self.verse_counts[index])
+        return self.verse_offsets[index] + vs - 1
+
+    def book_ordinals(self, book_id):
+        """the (first, last) verse ordinals of the given book"""
+        position = self.book_positions[int(book_id)]
+        return (
+            self.verse_offsets[self.chapter_offsets[position]],
+            self.verse_offsets[self.chapter_offsets[position + 1]] - 1,
+        )
+
+    def locations(self, first, last):
+        """the (book_id, ch, vs) of each verse ordinal from first to last, one at a time,
+        walking the chapters in order rather than locating each verse"""
+        if first > last:
+            return
+        book_id, ch, vs = self.locate(first)
+        self.locate(last)  # check the range before starting
+        position = self.book_positions[book_id]
+        index = self.chapter_offsets[position] + ch - 1
+        ordinal = first
+        while ordinal <= last:
+            while self.chapter_offsets[position + 1] <= index:
+                position += 1
+            book_id = self.book_ids[position]
+            ch = index - self.chapter_offsets[position] + 1
+            start = self.verse_offsets[index]
+            end = min(self.verse_offsets[index + 1] - 1, last)
+            for ordinal in range(ordinal, end + 1):
+                yield book_id, ch, ordinal - start + 1
+            ordinal = end + 1
+            index += 1
+
+    def locate(self, ordinal):
+        """the (book_id, ch, vs) of the given verse ordinal"""
+        if not 0 <= ordinal < self.verse_offsets[-1]:
+            raise IndexError("verse ordinal out of range: %r" % ordinal)
+        index = bisect_right(self.verse_offsets, ordinal) - 1
+        # books without chapters share their chapter offset with the next book
+        position = bisect_right(self.chapter_offsets, index) - 1
+        return (
+            self.book_ids[position],
+            index - self.chapter_offsets[position] + 1,
+            ordinal - self.verse_offsets[index] + 1,
+        )
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
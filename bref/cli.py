@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import batch, cache, service
+from .canon import CANONS_PATH, Canon, Canons
+from .stats import Stats
+
+
+def compile_canons(argv=None):
+    """bref-compile-canons: compile canons into the cache directory (see bref.cache), so
+    that Canon.load_by_name() and bref.canons don't have to parse the canon XML.
+    """
+    parser = argparse.ArgumentParser(
+        prog="bref-compile-canons",
+        description="Compile the canons in %s into the cache directory." % CANONS_PATH,
+    )
+    parser.add_argument(
+        "names", nargs="*", help="the canons to compile (default: all of them)"
+    )
+    parser.add_argument(
+        "--dir", help="the cache directory (default: %s)" % cache.cache_dir()
+    )
+    args = parser.parse_args(argv)
+
+    for name in args.names or Canons().names:
+        filepath = CANONS_PATH / f"{name}-canon.xml"
+        t = time.perf_counter()
+        canon, path = cache.rebuild(filepath, Canon.from_xml, dirpath=args.dir)
+        build_time = time.perf_counter() - t
+        if path is None:
+            parser.exit(1, "%s: could not write to the cache directory\n" % name)
+        t = time.perf_counter()
+        cache.load(filepath, Canon.from_xml, dirpath=args.dir)
+        load_time = time.perf_counter() - t
+        print(
+            "%s: %s (built in %.1f ms, loads in %.2f ms)"
+            % (name, path, build_time * 1000, load_time * 1000)
+        )
+
+
+def tag(argv=None):
+    """bref-tag: tag the references in XML files with a pool of processes (see
+    bref.batch), reporting the time taken for each file and the throughput overall.
+    """
+    parser = argparse.ArgumentParser(
+        prog="bref-tag",
+        description="Tag the references in XML files, in place or into an output dir.",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="XML files or glob patterns (quoted), e.g. 'docs/*.xml'",
+    )
+    parser.add_argument("-c", "--canon", required=True, help="the canon name, e.g. ESV")
+    parser.add_argument(
+        "-o", "--outdir", help="where to write the tagged files (default: in place)"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, help="worker processes (default: one per CPU)"
+    )
+    parser.add_argument("--xpath", help="the elements to tag (default: all elements)")
+    parser.add_argument("--bk", help="the book of references that don't name one")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="parse and write each file incrementally, for very large files",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="only report errors and the summary"
+    )
+    args = parser.parse_args(argv)
+    if args.canon not in Canons().names:
+        parser.error("unknown canon: %s" % args.canon)
+
+    def report(result):
+        if result.error is not None:
+            print("%s: ERROR %s" % (result.src, result.error))
+        elif not args.quiet:
+            print(
+                "%s -> %s: %.1f ms, %.1f KB"
+                % (result.src, result.dest, result.seconds * 1000, result.size / 1e3)
+            )
+
+    t = time.perf_counter()
+    try:
+        results = batch.tag_files(
+            args.paths,
+            args.canon,
+            outdir=args.outdir,
+            workers=args.workers,
+            xpath=args.xpath,
+            bk=args.bk,
+            stream=args.stream,
+            report=report,
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(batch.summary(results, time.perf_counter() - t))
+    if any(result.error is not None for result in results):
+        parser.exit(1)
+
+
+def serve(argv=None):
+    """bref-serve: answer JSON-lines requests on stdin and stdout with one warm parser
+    (see bref.service.serve_jsonlines).
+    """
+    parser = argparse.ArgumentParser(
+        prog="bref-serve",
+        description="Parse and tag references for JSON-lines requests on stdin.",
+    )
+    parser.add_argument("-c", "--canon", required=True, help="the canon name, e.g. ESV")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="worker processes (default: 1, a thread in the server process)",
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=1024, help="the number of results to cache"
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="time the parser stages and patterns, for the stats method (one worker)",
+    )
+    args = parser.parse_args(argv)
+    if args.canon not in Canons().names:
+        parser.error("unknown canon: %s" % args.canon)
+    if args.stats and args.workers > 1:
+        parser.error("--stats needs one worker")
+
+    executor = ProcessPoolExecutor(args.workers) if args.workers > 1 else None
+    refparser = service.AsyncRefParser(
+        args.canon,
+        executor=executor,
+        cache_size=args.cache_size,
+        stats=Stats() if args.stats else None,
+    )
+    service.worker(args.canon)  # warm up before the first request
+    try:
+        asyncio.run(service.serve_jsonlines(refparser))
+    finally:
+        refparser.shutdown()
+
+
+if __name__ == "__main__":
+    compile_canons()
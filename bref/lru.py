@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A bounded mapping that keeps the maxsize most recently used items.
+
+    >>> cache = LRUCache(maxsize=2)
+    >>> cache['a'] = 1; cache['b'] = 2; cache.get('a'); cache['c'] = 3
+    1
+    >>> 'b' in cache, len(cache), cache.hits, cache.misses
+    (False, 2, 1, 0)
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "LRUCache(maxsize=%r, size=%r, hits=%r, misses=%r)" % (
+            self.maxsize,
+            len(self.data),
+            self.hits,
+            self.misses,
+        )
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        """the value for key, which becomes the most recently used, or default"""
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = self.misses = 0
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
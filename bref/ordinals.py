@@ -0,0 +1,164 @@
+"""
+Bulk conversion between refs and verse ordinals (see CanonIndex) with NumPy, for
+working on large numbers of references without a Python loop per ref: (book id, ch, vs)
+arrays are encoded as int32 ordinals with the canon's verse-count tables, and decoded
+through tables of the chapter and book of each verse, which are built with searchsorted()
+on its cumulative verse counts. Ranges are (start, end) pairs.
+
+This module needs numpy (pip install bref[numpy]); the rest of bref doesn't.
+
+>>> from bref import canons
+>>> ordinals = encode([1, 1, 43, 66], [1, 2, 3, 22], [1, 1, 16, 21], canons.ESV)
+>>> ordinals
+array([    0,    31, 26135, 31101], dtype=int32)
+>>> [a.tolist() for a in decode(ordinals, canons.ESV)]
+[[1, 1, 43, 66], [1, 2, 3, 22], [1, 1, 16, 21]]
+>>> from bref.refparser import RefParser
+>>> pairs = encode_ranges(RefParser(canons.ESV).parse("Gen 1; Rom 8:28-39"), canons.ESV)
+>>> pairs.tolist()
+[[0, 30], [28143, 28154]]
+>>> print(decode_ranges(pairs, canons.ESV))
+[Gen.1.1-Gen.1.31, Rom.8.28-Rom.8.39]
+"""
+import numpy as np
+
+from .ref import Ref
+from .reflist import RefList
+from .refrange import RefRange
+
+# ch and vs for the end of a range without them: clamped to the last ch or vs
+LAST = np.iinfo(np.int32).max
+
+
+class Tables:
+    """the CanonIndex tables of a canon as NumPy arrays, with book_positions as an array
+    indexed by book id (-1 for ids that are not in the canon)"""
+
+    def __init__(self, canon):
+        index = canon.index
+        self.book_ids = np.array(index.book_ids, dtype=np.int32)
+        self.book_positions = np.full(int(self.book_ids.max()) + 1, -1, dtype=np.int32)
+        self.book_positions[self.book_ids] = np.arange(len(self.book_ids))
+        self.chapter_counts = np.array(index.chapter_counts, dtype=np.int32)
+        self.chapter_offsets = np.array(index.chapter_offsets, dtype=np.int32)
+        self.verse_counts = np.array(index.verse_counts, dtype=np.int32)
+        self.verse_offsets = np.array(index.verse_offsets, dtype=np.int32)
+        self.names = [book.name for book in canon.books]
+        # the chapter index and book position of each verse ordinal, from searchsorted()
+        # on the cumulative counts (books without chapters share their chapter offset
+        # with the next book), so that decoding is a lookup in these
+        self.verse_chapters = (
+            np.searchsorted(
+                self.verse_offsets, np.arange(self.verse_offsets[-1]), side="right"
+            )
+            - 1
+        ).astype(np.int32)
+        self.chapter_books = (
+            np.searchsorted(
+                self.chapter_offsets, np.arange(len(self.verse_counts)), side="right"
+            )
+            - 1
+        ).astype(np.int32)
+
+    @classmethod
+    def of(cls, canon):
+        """the Tables of the canon, built once and kept on it"""
+        return canon.derived("ordinal tables", canon.index, lambda: cls(canon))
+
+
+def encode(ids, chs, vss, canon):
+    """the int32 verse ordinals of the verses with the given book ids, chs and vss (array
+    likes of the same length). As with CanonIndex.ordinal(), ch and vs are clamped to the
+    book and chapter.
+    """
+    tables = Tables.of(canon)
+    ids = np.asarray(ids, dtype=np.int64)
+    known = (ids >= 0) & (ids < len(tables.book_positions))
+    positions = tables.book_positions[np.where(known, ids, 0)]
+    if not known.all() or (positions < 0).any():
+        bad = ids[~known | (positions < 0)]
+        raise ValueError("book ids not in the canon: %r" % sorted(set(bad.tolist())))
+    chapters = tables.chapter_counts[positions]
+    if (chapters == 0).any():
+        raise ValueError("books without chapters: %r" % ids[chapters == 0][:1].tolist())
+    chs = np.clip(np.asarray(chs, dtype=np.int64), 1, chapters)
+    index = tables.chapter_offsets[positions] + chs - 1
+    vss = np.clip(np.asarray(vss, dtype=np.int64), 1, tables.verse_counts[index])
+    return (tables.verse_offsets[index] + vss - 1).astype(np.int32)
+
+
+def decode(ordinals, canon):
+    """the (ids, chs, vss) int32 arrays of the given verse ordinals"""
+    tables = Tables.of(canon)
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    if ((ordinals < 0) | (ordinals >= tables.verse_offsets[-1])).any():
+        raise IndexError("verse ordinals out of range")
+    index = tables.verse_chapters[ordinals]
+    positions = tables.chapter_books[index]
+    return (
+        tables.book_ids[positions],
+        (index - tables.chapter_offsets[positions] + 1).astype(np.int32),
+        (ordinals - tables.verse_offsets[index] + 1).astype(np.int32),
+    )
+
+
+def encode_refs(refs, canon):
+    """the verse ordinals of a sequence of Refs, which need book ids (ch and vs default
+    to 1, as in Ref.ordinal())"""
+    ids, chs, vss = [], [], []
+    for ref in refs:
+        if ref.get("id") is None:
+            raise ValueError("a verse ordinal needs a Ref with a book id: %r" % ref)
+        ids.append(ref.get("id"))
+        chs.append(ref.get("ch") or 1)
+        vss.append(ref.get("vs") or 1)
+    return encode(ids, chs, vss, canon)
+
+
+def decode_refs(ordinals, canon):
+    """the Refs of the given verse ordinals, as Ref.from_ordinal() makes them"""
+    ids, chs, vss = decode(ordinals, canon)
+    tables = Tables.of(canon)
+    names = [tables.names[p] for p in tables.book_positions[ids].tolist()]
+    return [
+        Ref(id=id, bk=name, name=name, ch=ch, vs=vs)
+        for id, name, ch, vs in zip(ids.tolist(), names, chs.tolist(), vss.tolist())
+    ]
+
+
+def encode_refids(values, canon):
+    """the verse ordinals of packed RefId values (id * 10**6 + ch * 10**3 + vs)"""
+    values = np.asarray(values, dtype=np.int64)
+    return encode(values // 1000000, values // 1000 % 1000, values % 1000, canon)
+
+
+def encode_ranges(refranges, canon):
+    """an (n, 2) int32 array of the (start, end) verse ordinals of the RefRanges (such as
+    a RefList), without merging them. As in RefRange.ordinals(), an end without a ch or
+    vs runs to the end of its book or chapter.
+    """
+    ids, chs, vss = [], [], []
+    for start, end in refranges:
+        for ref, default in ((start, 1), (end, LAST)):
+            if ref.get("id") is None:
+                raise ValueError("verse ordinals need Refs with a book id: %r" % ref)
+            ch = ref.get("ch")
+            ids.append(ref.get("id"))
+            chs.append(default if ch is None else ch)
+            vss.append(
+                default if ch is None or ref.get("vs") is None else ref.get("vs")
+            )
+    return encode(ids, chs, vss, canon).reshape(-1, 2)
+
+
+def decode_ranges(pairs, canon):
+    """the RefList of (start, end) verse ordinal pairs (an (n, 2) array or a sequence of
+    pairs)"""
+    refs = decode_refs(np.asarray(pairs).reshape(-1), canon)
+    return RefList(RefRange(pair) for pair in zip(refs[::2], refs[1::2]))
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
@@ -6,7 +6,33 @@ from bl.dict import Dict
 
 @functools.total_ordering
 class Ref(Dict):
-    """Holds a single reference, with keys 'id' (int), 'name' (str), 'ch' (int), 'vs' (int)."""
+    """Holds a single reference, with keys 'id' (int), 'name' (str), 'ch' (int), 'vs' (int).
+
+    A Ref can also point to a book record (see set_book()), which is shared by the Refs in
+    that book. The fields of the record, such as title and abbr, read as if they were in
+    the Ref (ref.title, ref['title'], 'title' in ref) without being copied into it, and a
+    field set in the Ref takes precedence.
+
+    ref(), ref.copy(), copy.copy() and pickle keep the record. Ref(**ref) and dict(ref) copy
+    only the fields in the Ref itself, so copy refs with ref() or with
+    refparser.copy_reflist(). Refs compare by key(): book id or name, ch, vs and vsub, so
+    neither the record nor any other field makes a difference to equality or order.
+
+    >>> ref = Ref(id=1, name="Gen", ch=1, vs=1)
+    >>> ref.set_book(Dict(id=1, name="Gen", title="Genesis"))
+    >>> ref.title, ref(vs=2).title, ref.copy().title, Ref(**ref).title
+    ('Genesis', 'Genesis', 'Genesis', None)
+    >>> ref == Ref(**ref)
+    True
+    """
+
+    # the book record, in a slot rather than in an instance __dict__ for each Ref
+    __slots__ = ("book",)
+
+    def __new__(cls, *args, **kwargs):
+        ref = dict.__new__(cls)
+        object.__setattr__(ref, "book", None)
+        return ref
 
     def __init__(self, **args):
         Dict.__init__(self, **args)
@@ -17,6 +43,54 @@ class Ref(Dict):
         if self.vs is not None:
             self.vs = int(self.vs)
 
+    def __getattr__(self, name):
+        value = dict.get(self, name)
+        if value is None:
+            if name.startswith("__"):
+                # so that pickle and copy don't take None for __reduce__ etc.
+                raise AttributeError(name)
+            if self.book is not None:
+                return dict.get(self.book, name)
+        return value
+
+    def __missing__(self, key):
+        if self.book is None or key not in self.book:
+            raise KeyError(key)
+        return self.book[key]
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        if self.book is not None and key in self.book:
+            return self.book[key]
+        return default
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (
+            self.book is not None and key in self.book
+        )
+
+    def __getstate__(self):
+        return self.book
+
+    def __setstate__(self, book):
+        self.set_book(book)
+
+    def set_book(self, book):
+        """point this Ref to the given book record (None for none)"""
+        object.__setattr__(self, "book", book)
+
+    def __call__(self, **args):
+        """a copy of this Ref with the given fields set, pointing to the same book record"""
+        ref = Dict.__call__(self, **args)
+        ref.set_book(self.book)
+        return ref
+
+    def copy(self):
+        """a copy of this Ref, pointing to the same book record (dict.copy() would return
+        a plain dict without it)"""
+        return self()
+
     # -- Other Methods --
 
     def __repr__(self):
@@ -58,6 +132,19 @@ class Ref(Dict):
                 ref.name = book.name
         return ref
 
+    def ordinal(self, canon):
+        """the 0-based verse ordinal of this Ref in the given canon (see CanonIndex)"""
+        if self.id is None:
+            raise ValueError("a verse ordinal needs a Ref with a book id: %r" % self)
+        return canon.index.ordinal(self.id, self.ch or 1, self.vs or 1)
+
+    @classmethod
+    def from_ordinal(Class, ordinal, canon):
+        """use a given canon to convert a verse ordinal into a ref"""
+        id, ch, vs = canon.index.locate(ordinal)
+        name = canon.books[canon.index.book_positions[id]].name
+        return Class(id=id, bk=name, name=name, ch=ch, vs=vs)
+
     # comparison operators
 
     def __lt__(self, other):
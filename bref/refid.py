@@ -0,0 +1,133 @@
+import re
+
+from .ref import Ref
+
+
+class RefId:
+    """A compact form of a Ref: book id, ch and vs packed into one int,
+        value = id * 10**6 + ch * 10**3 + vs
+    (the digits of Ref.key()), with any vsub kept separately. RefIds have no __dict__,
+    and compare and hash as ints, so they can be kept by the million, sorted, and used as
+    dict keys. They sort in the same order as Ref.key().
+
+    >>> r = RefId.from_ref(Ref(id=43, ch=3, vs=16))
+    >>> r, r.id, r.ch, r.vs, r.key()
+    (RefId(43003016), 43, 3, 16, '043003016')
+    >>> RefId.from_key('043003016a') > r
+    True
+    >>> r < 43003017
+    Traceback (most recent call last):
+      ...
+    TypeError: '<' not supported between instances of 'RefId' and 'int'
+    """
+
+    __slots__ = ("value", "vsub")
+
+    def __init__(self, value, vsub=None):
+        self.value = value
+        self.vsub = vsub or ""
+
+    @classmethod
+    def from_parts(cls, id, ch, vs, vsub=None):
+        """create a RefId from a book id, ch, and vs"""
+        ch, vs = ch or 0, vs or 0
+        if not (0 <= ch < 1000 and 0 <= vs < 1000):
+            raise ValueError("ch and vs must be in the range 0-999: %r, %r" % (ch, vs))
+        return cls(int(id) * 1000000 + ch * 1000 + vs, vsub)
+
+    @classmethod
+    def from_ref(cls, ref):
+        """create a RefId from a Ref, which must have a book id"""
+        if ref.id is None:
+            raise ValueError("a RefId needs a Ref with a book id: %r" % ref)
+        return cls.from_parts(ref.id, ref.ch, ref.vs, ref.vsub)
+
+    @classmethod
+    def from_key(cls, key):
+        """create a RefId from a Ref.key() string"""
+        md = re.match(r"^(\d+)([a-z]*)$", key, flags=re.I)
+        if md is None:
+            raise ValueError("not a numeric Ref key: %r" % key)
+        return cls(int(md.group(1)), md.group(2))
+
+    def to_ref(self, canon=None):
+        """return the Ref for this RefId, with the book name if a canon is given"""
+        ref = Ref(id=self.id, ch=self.ch, vs=self.vs)
+        if self.vsub:
+            ref.vsub = self.vsub
+        if canon is not None:
+            position = canon.index.book_positions.get(self.id)
+            if position is not None:
+                ref.bk = ref.name = canon.books[position].name
+        return ref
+
+    def key(self):
+        """returns the same sortkey as Ref.key()"""
+        return "%09d%s" % (self.value, self.vsub)
+
+    @property
+    def id(self):
+        return self.value // 1000000
+
+    @property
+    def ch(self):
+        return self.value // 1000 % 1000
+
+    @property
+    def vs(self):
+        return self.value % 1000
+
+    def __int__(self):
+        return self.value
+
+    def __repr__(self):
+        if self.vsub:
+            return "RefId(%d, %r)" % (self.value, self.vsub)
+        return "RefId(%d)" % self.value
+
+    def __str__(self):
+        return "%d.%d.%d%s" % (self.id, self.ch, self.vs, self.vsub)
+
+    def __hash__(self):
+        return hash(self.value)
+
+    # comparison operators
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.value == other.value and self.vsub == other.vsub
+
+    def __lt__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.value < other.value or (
+            self.value == other.value and self.vsub < other.vsub
+        )
+
+    def __le__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.value < other.value or (
+            self.value == other.value and self.vsub <= other.vsub
+        )
+
+    def __gt__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.value > other.value or (
+            self.value == other.value and self.vsub > other.vsub
+        )
+
+    def __ge__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.value > other.value or (
+            self.value == other.value and self.vsub >= other.vsub
+        )
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
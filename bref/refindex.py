@@ -0,0 +1,162 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .ref import Ref
+
+
+class RefIndex:
+    """An index of (RefRange, payload) pairs for overlap and containment queries.
+
+    Each range is stored as its (first, last) verse ordinals in the canon (see
+    CanonIndex), in flat arrays sorted by first ordinal. On top of these the index keeps
+    an implicit augmented binary tree (as in cgranges): the element at position i is a
+    node at the level of the number of trailing 1-bits in i, and maxends[i] is the
+    greatest last ordinal in its subtree. So a query visits O(log n + k) nodes for k
+    hits, and the index needs no Python objects per range apart from the payloads.
+
+    Ranges can be added at any time; the index is (re)built on the next query.
+
+    >>> from bref import canons
+    >>> from bref.refparser import RefParser
+    >>> rp = RefParser(canons.ESV)
+    >>> ri = RefIndex(canons.ESV)
+    >>> for s in ['Rom 8', 'Rom 8:1-11', 'Rom 8:31-39', 'Rom 9-11', 'Gen 1']:
+    ...     ri.add(rp.parse(s)[0], s)
+    >>> ri.overlapping(rp.parse('Rom 8:28-39')[0])
+    ['Rom 8', 'Rom 8:31-39']
+    >>> ri.covering(rp.parse('Rom 8:3')[0][0])
+    ['Rom 8', 'Rom 8:1-11']
+    >>> ri.containing(rp.parse('Rom 8:31-32')[0])
+    ['Rom 8', 'Rom 8:31-39']
+    >>> ri.within(rp.parse('Rom 8-9')[0])
+    ['Rom 8', 'Rom 8:1-11', 'Rom 8:31-39']
+    """
+
+    def __init__(self, canon, items=None):
+        self.canon = canon
+        self.starts = array("L")
+        self.ends = array("L")
+        self.payloads = []
+        self.maxends = None
+        self.max_level = -1
+        if items is not None:
+            self.extend(items)
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def add(self, refrange, payload=None):
+        """add a RefRange to the index, with the given payload (default: the RefRange)"""
+        start, end = refrange.ordinals(self.canon)
+        self.add_ordinals(start, end, refrange if payload is None else payload)
+
+    def add_ordinals(self, start, end, payload):
+        """add the range of verse ordinals start..end (inclusive) to the index"""
+        if end < start:
+            raise ValueError("range ends before it starts: %r-%r" % (start, end))
+        self.starts.append(start)
+        self.ends.append(end)
+        self.payloads.append(payload)
+        self.maxends = None
+
+    def extend(self, items):
+        """add the given (RefRange, payload) pairs to the index"""
+        for refrange, payload in items:
+            self.add(refrange, payload)
+
+    def index(self):
+        """sort the ranges and build the tree; called as needed by the queries"""
+        n = len(self.payloads)
+        order = sorted(range(n), key=self.starts.__getitem__)
+        self.starts = array("L", [self.starts[i] for i in order])
+        self.ends = array("L", [self.ends[i] for i in order])
+        self.payloads = [self.payloads[i] for i in order]
+        self.maxends = maxends = array("L", self.ends)
+        self.max_level = -1
+        if n == 0:
+            return
+        last_i = n - 1 if (n - 1) % 2 == 0 else n - 2
+        last = maxends[last_i]
+        k = 1
+        while 1 << k <= n:
+            x = 1 << (k - 1)
+            for i in range((x << 1) - 1, n, x << 2):
+                right = maxends[i + x] if i + x < n else last
+                maxends[i] = max(maxends[i], maxends[i - x], right)
+            last_i = last_i - x if last_i >> k & 1 else last_i + x
+            if last_i < n and maxends[last_i] > last:
+                last = maxends[last_i]
+            k += 1
+        self.max_level = k - 1
+
+    def search(self, start, end):
+        """the positions, in index order, of the ranges that overlap start..end"""
+        if self.maxends is None:
+            self.index()
+        starts, ends, maxends, n = self.starts, self.ends, self.maxends, len(self.ends)
+        hits = []
+        if n == 0:
+            return hits
+        stack = [(self.max_level, (1 << self.max_level) - 1, False)]
+        while stack:
+            k, x, visited = stack.pop()
+            if k <= 3:
+                # small subtree: scan it
+                i0 = x >> k << k
+                for i in range(i0, min(i0 + (1 << (k + 1)) - 1, n)):
+                    if starts[i] > end:
+                        break
+                    if ends[i] >= start:
+                        hits.append(i)
+            elif not visited:
+                stack.append((k, x, True))
+                y = x - (1 << (k - 1))
+                if y >= n or maxends[y] >= start:
+                    stack.append((k - 1, y, False))
+            elif x < n and starts[x] <= end:
+                if ends[x] >= start:
+                    hits.append(x)
+                stack.append((k - 1, x + (1 << (k - 1)), False))
+        hits.sort()
+        return hits
+
+    def ordinals(self, query):
+        """the (first, last) verse ordinals of a Ref or RefRange query"""
+        if isinstance(query, Ref):
+            ordinal = query.ordinal(self.canon)
+            return (ordinal, ordinal)
+        return query.ordinals(self.canon)
+
+    def overlapping(self, query):
+        """the payloads of the ranges that overlap the given Ref or RefRange"""
+        return [self.payloads[i] for i in self.search(*self.ordinals(query))]
+
+    def covering(self, ref):
+        """the payloads of the ranges that include the given verse"""
+        return self.overlapping(ref)
+
+    def containing(self, query):
+        """the payloads of the ranges that include all of the given Ref or RefRange"""
+        start, end = self.ordinals(query)
+        return [
+            self.payloads[i] for i in self.search(start, start) if self.ends[i] >= end
+        ]
+
+    def within(self, query):
+        """the payloads of the ranges that lie inside the given Ref or RefRange"""
+        start, end = self.ordinals(query)
+        if self.maxends is None:
+            self.index()
+        return [
+            self.payloads[i]
+            for i in range(
+                bisect_left(self.starts, start), bisect_right(self.starts, end)
+            )
+            if self.ends[i] <= end
+        ]
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
@@ -1,5 +1,30 @@
+from .ref import Ref
+from .refrange import RefRange, iter_verses
+
+
 class RefList(list):
-    """the type of the object returned by RefParser.parse() -- a list of RefRanges."""
+    """the type of the object returned by RefParser.parse() -- a list of RefRanges.
+
+    The set operations work on the canon's verse ordinals (see CanonIndex): each returns a
+    new, normalized RefList of non-overlapping, non-adjacent ranges in canon order. Verse
+    subdivisions (vsub) and verse 0 (titles) are not distinguished from whole verses.
+
+    >>> from bref import canons
+    >>> from bref.refparser import RefParser
+    >>> rp = RefParser(canons.ESV)
+    >>> print(rp.parse('Gen 1:1-5; Gen 1:3-10; Gen 1:11').normalize(canons.ESV))
+    [Gen.1.1-Gen.1.11]
+    >>> print(rp.parse('Gen 1:30-31').union(rp.parse('Gen 2:1-3'), canons.ESV))
+    [Gen.1.30-Gen.2.3]
+    >>> print(rp.parse('Rom 8').intersection(rp.parse('Rom 8:28-9:5'), canons.ESV))
+    [Rom.8.28-Rom.8.39]
+    >>> print(rp.parse('Rom 8').difference(rp.parse('Rom 8:5-10, 28'), canons.ESV))
+    [Rom.8.1-Rom.8.4, Rom.8.11-Rom.8.27, Rom.8.29-Rom.8.39]
+    >>> rp.parse('Gen - Rev').verse_count(canons.ESV)
+    31102
+    >>> [str(ref) for ref in rp.parse('Gen 1:30-2:2; Gen 1:31').iter_verses(canons.ESV)]
+    ['Gen.1.30', 'Gen.1.31', 'Gen.2.1', 'Gen.2.2']
+    """
 
     def __str__(self):
         return "[%s]" % ", ".join([str(r) for r in self])
@@ -7,6 +32,84 @@ class RefList(list):
     def __repr__(self):
         return "RefList(%s)" % ", ".join([repr(r) for r in self])
 
+    def ordinals(self, canon):
+        """the (first, last) verse ordinals of each range, merged and sorted"""
+        return merge_ordinals(refrange.ordinals(canon) for refrange in self)
+
+    @classmethod
+    def from_ordinals(Class, pairs, canon):
+        """create a RefList from (first, last) verse ordinal pairs in the given canon"""
+        return Class(
+            RefRange((Ref.from_ordinal(first, canon), Ref.from_ordinal(last, canon)))
+            for first, last in pairs
+        )
+
+    def verse_count(self, canon):
+        """the number of distinct verses in this RefList, counted from the merged verse
+        ordinals of its ranges"""
+        return sum(last - first + 1 for first, last in self.ordinals(canon))
+
+    def iter_verses(self, canon):
+        """the Refs of the distinct verses in this RefList, one at a time, in canon order
+        (the verses of normalize(), without building the list)"""
+        for first, last in self.ordinals(canon):
+            yield from iter_verses(canon, first, last)
+
+    def normalize(self, canon):
+        """this RefList with overlapping and adjacent ranges merged, in canon order"""
+        return self.from_ordinals(self.ordinals(canon), canon)
+
+    def union(self, other, canon):
+        """the verses in this RefList or the other"""
+        return self.from_ordinals(
+            merge_ordinals(self.ordinals(canon) + other.ordinals(canon)), canon
+        )
+
+    def intersection(self, other, canon):
+        """the verses in both this RefList and the other"""
+        a, b = self.ordinals(canon), other.ordinals(canon)
+        pairs = []
+        i = j = 0
+        while i < len(a) and j < len(b):
+            first, last = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+            if first <= last:
+                pairs.append((first, last))
+            if a[i][1] < b[j][1]:
+                i += 1
+            else:
+                j += 1
+        return self.from_ordinals(pairs, canon)
+
+    def difference(self, other, canon):
+        """the verses in this RefList that are not in the other"""
+        b = other.ordinals(canon)
+        pairs = []
+        j = 0
+        for first, last in self.ordinals(canon):
+            while j < len(b) and b[j][1] < first:
+                j += 1
+            k = j
+            while k < len(b) and b[k][0] <= last:
+                if b[k][0] > first:
+                    pairs.append((first, b[k][0] - 1))
+                first = max(first, b[k][1] + 1)
+                k += 1
+            if first <= last:
+                pairs.append((first, last))
+        return self.from_ordinals(pairs, canon)
+
+
+def merge_ordinals(pairs):
+    """sort (first, last) ordinal pairs and merge those that overlap or are adjacent"""
+    merged = []
+    for first, last in sorted(pairs):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
 
 if __name__ == "__main__":
     import doctest
@@ -1,62 +1,249 @@
+import functools
 import logging
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 from bl.dict import Dict
 from bxml.xml import XML
 
 from .book import Book
 from .canon import Canon
+from .canonindex import CanonIndex
+from .lru import LRUCache
 from .ref import Ref
 from .reflist import RefList
 from .refrange import RefRange
 
 LOG = logging.getLogger(__name__)
 
+MISSING = object()
+
+# Tables and patterns for RefParser.clean_refstring(), which applies them in this order.
+CLEAN_EDGES = re.compile(r"(^\W+|\W+$)")
+CLEAN_SPECIAL = re.compile(r"[()\[\]{}<>\\&\t\r\n\x80-\U0010ffff]")
+CLEAN_BRACKETS = str.maketrans("", "", "()[]{}<>")
+CLEAN_SEPARATORS = str.maketrans({":": ".", "_": " ", "\\": None})
+CLEAN_ENTITIES = re.compile(r"&#(?:160|150|151|8211|8212|x201[0-4]);")
+CLEAN_SPACES_DASHES = str.maketrans(
+    {
+        "\u00a0": " ",
+        "\t": " ",
+        "\u2010": "-",
+        "\u2011": "-",
+        "\u2013": "-",
+        "\u2014": "-",
+        "\x96": "-",
+        "\x97": "-",
+        "\r": ";",
+        "\n": ";",
+    }
+)
+CLEAN_REPEATS = re.compile(r"([;\-\ .,])\1+")
+CLEAN_NUMBERED_BOOK = re.compile(r"([123])\s+([A-Za-z])")
+CLEAN_NUMBER_WORDS = re.compile(r"(?i)(?:(first)|(second)|(third))\s*")
+CLEAN_SONG = re.compile(r"Song\.[^0-9]*")
+CLEAN_TITLE = re.compile(r"\.title", flags=re.I)
+CLEAN_HEADING = re.compile(r",\s*(heading|title)", flags=re.I)
+CLEAN_THE = re.compile(r"^The\W+")
+CLEAN_BOOK_LIST = re.compile(r"^(\d+),(\d+)(\w+)")
+CLEAN_BOOK_RANGE = re.compile(r"^(\d+)-(\d+)(\D+)")
+
+
+def clean_entity(md):
+    return " " if md.group(0) == "&#160;" else "-"
+
+
+def clean_number_word(md):
+    return str(md.lastindex)  # first, second, third
+
+
+# Token kinds produced by tokenize()
+DOT, COMMA, SEMICOLON, DASH, CHAPTER, CONTENT = range(6)
+TOKEN_KINDS = {".": DOT, ",": COMMA, ";": SEMICOLON, "-": DASH}
+TOKEN_SPLIT = re.compile(r"([.,;\-] ?)")
+TOKEN_CHAPTER = re.compile(r"^(?:ch|chap|chapter)?s?$", flags=re.I)
+TOKEN_FOLLOWING = re.compile(r"^[0-9]+(ff?)$", flags=re.I)
+DIGITS = re.compile(r"[0-9]+")
+VS_SUB = re.compile(r"[^0-9\W]+$")  # letters after a verse number
+
+# parse_cleaned() states: what kind of content token is expected next ...
+EXPECT_BOOK, EXPECT_BOOKORCH, EXPECT_CHORVS, EXPECT_CH, EXPECT_VS, EXPECT_SEP = range(6)
+# ... and what the previous content token was
+PREV_NONE, PREV_BOOK, PREV_CH, PREV_VS = range(4)
+# the state after a separator token, by the previous content token (None: no change)
+AFTER_DOT = {PREV_CH: EXPECT_VS}  # PREV_BOOK depends on the book
+AFTER_DASH = {PREV_BOOK: EXPECT_BOOK, PREV_CH: EXPECT_BOOKORCH, PREV_VS: EXPECT_CHORVS}
+AFTER_COMMA = {
+    PREV_NONE: EXPECT_BOOK,
+    PREV_BOOK: EXPECT_BOOK,
+    PREV_CH: EXPECT_BOOKORCH,
+    PREV_VS: EXPECT_VS,
+}
+AFTER_SEMICOLON = {
+    PREV_NONE: EXPECT_BOOK,
+    PREV_BOOK: EXPECT_BOOK,
+    PREV_CH: EXPECT_BOOKORCH,
+    PREV_VS: EXPECT_BOOKORCH,
+}
+
+
+def tokenize(refstring):
+    """Split a cleaned refstring into a list of (kind, token) pairs: the separators
+    ".,;-", chapter words, and content tokens (book names and numbers). A number followed
+    by "f" or "ff" becomes the number, "-", and the special content token "F" or "FF" (the
+    following ch or vs, or the last one).
+    """
+    tokens = []
+    for i, token in enumerate(TOKEN_SPLIT.split(refstring)):
+        kind = TOKEN_KINDS.get(token)
+        if kind is None:
+            if TOKEN_CHAPTER.match(token) is not None:
+                kind = CHAPTER
+            else:
+                kind = CONTENT
+                md = TOKEN_FOLLOWING.match(token) if i > 0 else None
+                if md is not None:
+                    tokens.append((CONTENT, token.replace("f", "", 2)))
+                    tokens.append((DASH, "-"))
+                    token = "F" if len(md.group(1)) == 1 else "FF"
+        tokens.append((kind, token))
+    return tokens
+
 
 class RefParser(Dict):
     """Tool to
     * tell if a string is a Ref,
     * parse strings into Refs, and
     * format RefLists and RefRanges.
+
+    Given a Stats (see bref.stats), the parser adds the calls and time of each stage to
+    it: clean, tokenize, state_machine and fill_range in parse(), and format() and
+    refstring(). With stats=None, the default, nothing is measured.
     """
 
     def __repr__(self):
         return "RefParser(%s)" % repr(self.canon)
 
-    def __init__(self, canon=None):
+    def __init__(self, canon=None, stats=None):
         if type(canon) == Canon:
             self.canon = canon
         else:
             Dict.__init__(self, canon=Canon.from_xml(XML(fn=canon)))
+        if self.canon.index is None:
+            self.canon.index = CanonIndex(self.canon.books)
         for book in self.canon.books:
             if book.pattern is not None:
                 book.rexp = re.compile(book.pattern, flags=re.I + re.U)
+        self.index_books()
+        self.parse_cache = LRUCache()
+        self.stats = stats
+
+    def index_books(self):
+        """build the lookup tables that match_book() uses:
+        * books_rexp: all the book patterns as one alternation, with a named group for
+            each book position, so that one match finds the first book that matches.
+        * book_names: book name, title, and abbr, as given and as cleaned by
+            clean_refstring(), mapped to the Book that the linear search would return.
+        * book_folded: the same forms, case-folded, mapped to the first Book that has them.
+        * search_book: match_book() for tokens not in book_names, with an LRU cache.
+        """
+        books = self.canon.books
+        self.books_rexp = re.compile(
+            "|".join(
+                "(?P<b%d>%s)" % (position, book.pattern)
+                for position, book in enumerate(books)
+                if book.rexp is not None
+            ),
+            flags=re.I + re.U,
+        )
+        # the first book that has each form (including None, for books without an abbr)
+        forms = {}
+        for position, book in enumerate(books):
+            for form in [book.name, book.title, book.abbr]:
+                forms.setdefault(form, position)
+                if form:
+                    cleaned = self.clean_refstring(form)
+                    for key in [cleaned, re.split(r"[.,;\-]", cleaned)[0]]:
+                        if key:
+                            forms.setdefault(key, position)
+        # the first book that has the form or matches it, as in the linear search
+        self.book_names = {}
+        self.book_folded = {}
+        for key, position in forms.items():
+            if key:
+                position = min(position, self.rexp_book_position(key, position))
+                self.book_folded.setdefault(key.casefold(), books[position])
+            self.book_names[key] = books[position]
+        self.search_book = functools.lru_cache(maxsize=4096)(self.search_book_rexp)
+        # label -> the label as clean_refstring() normalizes it in a refstring, for each
+        # label field of the books (name, title, abbr...), which format_refstring() uses
+        self.refstring_labels = {}
+        for label in ["Psalm"] + [
+            value
+            for book in books
+            for key, value in book.items()
+            if key not in ["chapters", "pattern", "pattern_strict", "rexp"]
+        ]:
+            if label not in self.refstring_labels:
+                normalized = self.normalize_label(label)
+                if normalized is not None:
+                    self.refstring_labels[label] = normalized
+        # the first book with each name, and its record for the Refs in it: the fields of
+        # the book except its chapters and patterns (see copy_book_fields())
+        self.books_by_name = {}
+        self.book_records = {}
+        for book in books:
+            if book.name not in self.books_by_name:
+                self.books_by_name[book.name] = book
+                self.book_records[book.name] = Book(
+                    **{
+                        key: value
+                        for key, value in book.items()
+                        if key not in ["chapters", "pattern", "rexp"]
+                    }
+                )
 
     def match_book(self, bkarg):
         """return the Book record for a given bk arg"""
-        for book in self.canon.books:
-            if book.name == bkarg or book.title == bkarg or book.abbr == bkarg:
-                return book
-            elif book.rexp is not None and re.match(book.rexp, bkarg):
-                return book
+        book = self.book_names.get(bkarg)
+        if book is None and bkarg:
+            book = self.search_book(bkarg)
+        return book
+
+    def search_book_rexp(self, bkarg):
+        """return the first book that bkarg matches case-insensitively, either one of the
+        book's forms or its pattern"""
+        book = self.book_folded.get(bkarg.casefold())
+        position = len(self.canon.books)
+        if book is not None:
+            position = self.canon.index.book_positions[int(book.id)]
+        rexp_position = self.rexp_book_position(bkarg, position)
+        if rexp_position < position:
+            book = self.canon.books[rexp_position]
+        return book
+
+    def rexp_book_position(self, bkarg, default=None):
+        """return the position of the first book whose pattern matches bkarg"""
+        md = self.books_rexp.match(bkarg)
+        if md is None or md.lastgroup is None:
+            return default
+        return int(md.lastgroup[1:])
 
     def chapters_in(self, bk):
         """return the number of chapters in a given book"""
         book = self.match_book(bk)
-        return len(book.chapters)
+        return self.canon.index.chapters_in(book.id)
 
     def verses_in(self, bk, ch):
         """return the number of verses in a given book and chapter"""
         book = self.match_book(bk)
-        if len(book.chapters) < int(ch) - 1:
-            return 0
-        else:
-            return int(book.chapters[int(ch) - 1].vss)
+        return self.canon.index.verses_in(book.id, ch)
 
     def clean_intstr(self, intstr=None):
         """return a string that will convert cleanly to an int"""
         if intstr is not None:
-            md = re.search("[0-9]+", str(intstr))
+            md = DIGITS.search(str(intstr))
             if md is not None:
                 return md.group(0)
 
@@ -75,39 +262,52 @@ class RefParser(Dict):
         * whole books indicated by book name without chapter or verse numbers
         * following references that lack a bookname take it from the previous reference
         """
+        stats = self.get("stats")
+        if stats is None:
+            return self.parse_cleaned(self.clean_input(refstring), bk=bk)
+        start = time.perf_counter()
+        refstring = self.clean_input(refstring)
+        stats.add("clean", time.perf_counter() - start)
+        return self.parse_cleaned(refstring, bk=bk)
+
+    def clean_input(self, refstring):
+        """the refstring as parse() sees it: ids converted, or cleaned by clean_refstring()"""
         if re.match(r"^[\d\-,]+$", refstring):
-            refstring = self.refstr_from_ids(refstring)
+            return self.refstr_from_ids(refstring)
         else:
-            refstring = self.clean_refstring(refstring)
-        LOG.debug("%s %s" % (refstring, "[" + (bk or "") + "]"))
-
-        tokens = re.split(r"([.,;\-] ?)", refstring)  # sequence of tokens
-
-        # look for 'f' or 'ff' at the end of numeric tokens
-        for i in range(len(tokens) - 1, 0, -1):  # count backwards to avoid conflict
-            if re.match("^[0-9]+f$", tokens[i], re.I):
-                tokens[i] = re.sub("f", "", tokens[i], re.I)
-                tokens.insert(i + 1, "-")
-                tokens.insert(
-                    i + 2, "F"
-                )  # special token: get the next ch or vs number.
-            elif re.match("^[0-9]+ff$", tokens[i], re.I):
-                tokens[i] = re.sub("f", "", tokens[i], re.I)
-                tokens.insert(i + 1, "-")
-                tokens.insert(
-                    i + 2, "FF"
-                )  # special token: get the last ch or vs number.
+            return self.clean_refstring(refstring)
+
+    def parse_cleaned(self, refstring, bk=None):
+        """parse a refstring that has already been through clean_input()"""
+        LOG.debug("%s [%s]", refstring, bk or "")
+        stats = self.get("stats")
+        if stats is None:
+            return self.parse_tokens(tokenize(refstring), bk=bk)
+        start = time.perf_counter()
+        tokens = tokenize(refstring)
+        tokenized = time.perf_counter()
+        stats.add("tokenize", tokenized - start)
+        filling = stats.seconds.get("fill_range", 0.0)
+        try:
+            return self.parse_tokens(tokens, bk=bk)
+        finally:
+            # the time of the state machine, without the time append_range() took to fill
+            filled = stats.seconds.get("fill_range", 0.0) - filling
+            stats.add("state_machine", time.perf_counter() - tokenized - filled)
+
+    def parse_tokens(self, tokens, bk=None):
+        """run the state machine of parse() on the tokens of a cleaned refstring"""
+        trace = debug_trace()
 
         # either bk is a parameter or the first token, or this is not a reference
-        if self.match_book(tokens[0]) is None:
+        if self.match_book(tokens[0][1]) is None:
             if bk is None:
                 return RefList()
             else:  # bk is not None
                 trybook = self.match_book(bk)
                 if trybook is not None:
                     # insert the book and sep at beginning of token list
-                    tokens.insert(0, ".")
-                    tokens.insert(0, trybook.name)
+                    tokens[:0] = [(CONTENT, trybook.name), (DOT, ".")]
 
         # initialize data
         reflist = RefList()
@@ -115,33 +315,27 @@ class RefParser(Dict):
         cref = crng[0]
 
         # initial conditions
-        prev = None  # the type of the previous token
+        prev = PREV_NONE  # the type of the previous content token
         book = Book()
-        expect = "BOOK"  # start by looking for a book token
+        expect = EXPECT_BOOK  # start by looking for a book token
 
         # state machine operates on each token and can access prev and next tokens
-        for i in range(len(tokens)):
-            token = tokens[i]
-            LOG.debug("token = %r\texpect = %r\tprev = %r" % (token, expect, prev))
+        for i, (kind, token) in enumerate(tokens):
+            trace("token = %r\texpect = %r\tprev = %r", token, expect, prev)
 
-            if token == ".":  # .
-                if prev == "BOOK":
-                    # if one chapter book, expect ch or vs
+            if kind == DOT:
+                if prev == PREV_BOOK:
+                    # if one chapter book, expect ch or vs, otherwise, expect ch
                     if self.chapters_in(book.name) == 1:
-                        expect = "CHORVS"
-                    # otherwise, expect ch
+                        expect = EXPECT_CHORVS
                     else:
-                        expect = "CH"
-                elif prev == "CH":
-                    expect = "VS"
-            elif re.match(
-                "^(?:ch|chap|chapter)?s?$", token, re.I
-            ):  # the word "chapter" or some form thereof
-                expect = "CH"
-            elif token in [
-                ";",
-                ",",
-            ]:  # ; or , -- slightly different, but some overlap as well
+                        expect = EXPECT_CH
+                else:
+                    expect = AFTER_DOT.get(prev, expect)
+            elif kind == CHAPTER:  # the word "chapter" or some form thereof
+                expect = EXPECT_CH
+            elif kind == COMMA or kind == SEMICOLON:
+                # ; or , -- slightly different, but some overlap as well
                 # add crng to reflist and initialize new range
                 self.append_range(crng, reflist)
 
@@ -149,187 +343,288 @@ class RefParser(Dict):
                 crng = RefRange((Ref(), Ref()))
                 cref = crng[0]
                 cref.bk = prevref.bk
-                LOG.debug("--> new crng = %r" % crng)
-                # if no previous token or previous token was a book, expect a book
-                if prev in [None, "BOOK"]:
-                    expect = "BOOK"
-                # if the previous token was a ch, expect a book or a ch
-                elif prev == "CH":
-                    expect = "BOOKORCH"
-                # if prev was a vs, depends on whether it's ; or ,
-                else:
-                    if token == ",":
-                        expect = "VS"
+                trace("--> new crng = %r", crng)
+                if kind == COMMA:
+                    expect = AFTER_COMMA[prev]
+                    if prev == PREV_VS:
                         cref.ch = prevref.ch
-                    if token == ";":
-                        expect = "BOOKORCH"
-            elif token == "-":  # -
+                else:
+                    expect = AFTER_SEMICOLON[prev]
+            elif kind == DASH:
                 # switch cref to crng[1]
                 cref = crng[1]
-                LOG.debug("--> switch to crng[1] = %r" % crng[1])
-                # if the previous token was a book, expect a book
-                if prev == "BOOK":
-                    expect = "BOOK"
-                # if the previous token was a ch, expect a book or a ch
-                elif prev == "CH":
-                    expect = "BOOKORCH"
-                # if the previous token was a vs, expect a ch or a vs (depends on following token)
-                elif prev == "VS":
-                    expect = "CHORVS"
+                trace("--> switch to crng[1] = %r", crng[1])
+                expect = AFTER_DASH.get(prev, expect)
             else:  # content token
-                if expect == "BOOK":
+                if expect == EXPECT_BOOK:
                     # if the token matches a book, then assign it as the book for cref
                     trybook = self.match_book(token)
                     if trybook is not None:
                         book = trybook
-                        # for k in book.keys(): cref[k] = book[k]
                         cref.bk = book.name
                         cref.id = book.id
-                        LOG.debug("--> book = %r" % book.name)
+                        trace("--> book = %r", book.name)
                     # otherwise, the book is null
-                    prev = "BOOK"
-                elif expect == "BOOKORCH":
+                    prev = PREV_BOOK
+                elif expect == EXPECT_VS:
+                    trybook = self.match_book(token)
+                    if trybook is not None:
+                        # the token is a book! yes, it can happen
+                        book = trybook
+                        self.copy_book_fields(book.name, cref)
+                        cref.bk = book.name
+                        cref.vs = cref.ch = None  # no ch assignment yet
+                        trace("--> bk = %r", token)
+                        prev = PREV_BOOK
+                    else:
+                        cref.vs = self.get_vs(crng, token)
+                        trace("--> vs = %r", token)
+                        prev = PREV_VS
+                elif expect == EXPECT_CH:
+                    # the token is a ch
+                    cref.ch = self.get_ch(crng, token)
+                    trace("--> ch = %r", token)
+                    prev = PREV_CH
+                elif expect == EXPECT_BOOKORCH:
                     # if the token matches a book, then assign it as the book for cref
                     trybook = self.match_book(token)
                     if trybook is not None:
                         book = trybook
-                        for k in book.keys():
-                            cref[k] = book[k]
+                        self.copy_book_fields(book.name, cref)
                         cref.bk = book.name
-                        prev = "BOOK"
-                        LOG.debug("--> book = %r" % book.name)
+                        prev = PREV_BOOK
+                        trace("--> book = %r", book.name)
                     # otherwise, assign it as the chapter for the cref
+                    elif self.chapters_in(crng[0].bk) == 1 and token != "1":
+                        cref.ch = "1"
+                        cref.vs = self.get_vs(crng, token)
+                        trace("--> vs = %r", token)
+                        prev = PREV_VS
                     else:
-                        if self.chapters_in(crng[0].bk) == 1 and token != "1":
-                            cref.ch = "1"
-                            cref.vs = self.get_vs(crng, token)
-                            LOG.debug("--> vs = %r" % token)
-                            prev = "VS"
-                        else:
-                            cref.ch = self.get_ch(crng, token)
-                            LOG.debug("--> ch = %r" % token)
-                            prev = "CH"
-                elif expect == "CHORVS":
-                    # either prev=='VS' followed by '-',
-                    # or prev=='BOOK'
-                    # set up following token
-                    if i + 1 < len(tokens):
-                        following = tokens[i + 1]
-                    else:
-                        following = None
-                    # prev vs
-                    if prev == "VS" and tokens[i - 1] == "-":
+                        cref.ch = self.get_ch(crng, token)
+                        trace("--> ch = %r", token)
+                        prev = PREV_CH
+                elif expect == EXPECT_CHORVS:
+                    # either prev == PREV_VS followed by '-', or prev == PREV_BOOK
+                    following = tokens[i + 1][0] if i + 1 < len(tokens) else None
+                    if prev == PREV_VS and tokens[i - 1][0] == DASH:
                         trybook = self.match_book(token)
                         if trybook is not None:
                             book = trybook
-                            for k in book.keys():
-                                cref[k] = book[k]
+                            self.copy_book_fields(book.name, cref)
                             cref.bk = book.name
-                            LOG.debug("--> book = %r" % book.name)
-                            prev = "BOOK"
-                        elif following == ".":
+                            trace("--> book = %r", book.name)
+                            prev = PREV_BOOK
+                        elif following == DOT:
                             # the token is a ch
                             cref.ch = self.get_ch(crng, token)
-                            LOG.debug("--> ch = %r" % cref.ch)
-                            prev = "CH"
+                            trace("--> ch = %r", cref.ch)
+                            prev = PREV_CH
                         else:
                             # the token is a vs
                             cref.vs = self.get_vs(crng, token)
-                            LOG.debug("--> vs = %r" % cref.vs)
-                            prev = "VS"
+                            trace("--> vs = %r", cref.vs)
+                            prev = PREV_VS
                     # prev one ch book
-                    elif prev == "BOOK":
+                    elif prev == PREV_BOOK:
                         if self.chapters_in(cref.bk) == 1:
-                            LOG.debug("one-chapter book= %r" % cref.bk)
+                            trace("one-chapter book= %r", cref.bk)
                             # it's a one-chapter book
-                            if token != "1":
+                            if token != "1" or following == DASH or following == COMMA:
                                 cref.vs = self.get_vs(crng, token)
-                                LOG.debug("--> vs = %r" % token)
-                                prev = "VS"
-                            elif following == ".":
-                                cref.ch = self.get_ch(crng, token)
-                                LOG.debug("--> ch = %r" % token)
-                                prev = "CH"
-                            elif following in ["-", ","]:
-                                cref.vs = self.get_vs(crng, token)
-                                LOG.debug("--> vs = %r" % token)
-                                prev = "VS"
+                                trace("--> vs = %r", token)
+                                prev = PREV_VS
                             else:
                                 cref.ch = self.get_ch(crng, token)
-                                LOG.debug("--> ch = %r" % token)
-                                prev = "CH"
+                                trace("--> ch = %r", token)
+                                prev = PREV_CH
                         else:
                             # multi-chapter book, so this is a ch
                             cref.ch = self.get_ch(crng, token)
-                            LOG.debug("--> ch = %r" % token)
-                            prev = "CH"
-                elif expect == "CH":
-                    # the token is a ch
-                    cref.ch = self.get_ch(crng, token)
-                    LOG.debug("--> ch = %r" % token)
-                    prev = "CH"
-                elif expect == "VS":
-                    trybook = self.match_book(token)
-                    if trybook is not None:
-                        # the token is a book! yes, it can happen
-                        trybook = self.match_book(token)
-                        if trybook is not None:
-                            book = trybook
-                            for k in book.keys():
-                                cref[k] = book[k]
-                            cref.bk = book.name
-                        cref.vs = cref.ch = None  # no ch assignment yet
-                        LOG.debug("--> bk = %r" % token)
-                        prev = "BOOK"
-                    else:
-                        cref.vs = self.get_vs(crng, token)
-                        LOG.debug("--> vs = %r" % token)
-                        prev = "VS"
-                # expect 'SEP' after a content token
-                expect = "SEP"
+                            trace("--> ch = %r", token)
+                            prev = PREV_CH
+                # expect a separator after a content token
+                expect = EXPECT_SEP
 
         # close out last range
         self.append_range(crng, reflist)
-
         return reflist
 
+    def parse_many(self, refstrings, bk=None, workers=None, chunksize=256):
+        """Parse many reference strings. Returns a list of RefLists, the same as
+            [self.parse(refstring, bk=bk) for refstring in refstrings]
+
+        Each distinct refstring is cleaned once, and results are kept in self.parse_cache
+        (keyed on the cleaned string and bk), so repeated strings are only parsed once.
+        If workers > 1, the strings that are not in the cache are parsed in a
+        ProcessPoolExecutor with that many processes, each of which loads the canon once,
+        and chunksize strings are sent to a process at a time.
+        """
+        refstrings = list(refstrings)
+        keys = {
+            refstring: (self.clean_input(refstring), bk)
+            for refstring in dict.fromkeys(refstrings)
+        }
+        results = {}
+        todo = []
+        for key in dict.fromkeys(keys.values()):
+            result = self.parse_cache.get(key)
+            if result is None:
+                todo.append(key)
+            else:
+                results[key] = result
+        if workers is not None and workers > 1 and len(todo) > chunksize:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker, initargs=(self.canon,)
+            ) as executor:
+                parsed = list(executor.map(parse_in_worker, todo, chunksize=chunksize))
+        else:
+            parsed = [self.parse_cleaned(*key) for key in todo]
+        for key, result in zip(todo, parsed):
+            results[key] = self.parse_cache[key] = result
+        # the cached RefLists are shared, so each caller gets a copy
+        return [copy_reflist(results[keys[refstring]]) for refstring in refstrings]
+
     def get_ch(self, crng, token):
-        if token == "F":
-            r = self.parse("%s %s" % (crng[0].bk, str(int(crng[0].ch) + 1)))
-            LOG.debug("get_ch, F: r = %r" % r)
-            return r[0][0].ch
-        elif token == "FF":
-            r = self.parse("%(bk)s" % crng[0])
-            LOG.debug("get_ch, FF: r = %r" % r)
-            return r[0][1].ch
+        """the ch for a ch token: "F" is the chapter after crng[0], and "FF" is the last
+        chapter of its book, both within the book (so "F" in a one-chapter book is 1)"""
+        if token == "F" or token == "FF":
+            chapters = self.chapters_in(self.following_book(crng))
+            if token == "FF":
+                return chapters
+            return min(int(self.clean_intstr(crng[0].ch) or 0) + 1, chapters)
         else:
             return token
 
     def get_vs(self, crng, token):
-        if token == "F":
-            r = self.parse(
-                "%s %s:%s" % (crng[0].bk, crng[0].ch, str(int(crng[0].vs) + 1))
+        """the vs for a vs token: "F" is the verse after crng[0], and "FF" is the last verse
+        of its chapter, both within the chapter (so "Gen 50:26f" is Gen 50:26)"""
+        if token == "F" or token == "FF":
+            verses = self.verses_in(
+                self.following_book(crng), self.clean_intstr(crng[0].ch) or 1
             )
-            LOG.debug("get_vs, F: r = %r" % r)
-            return r[0][0].vs
-        elif token == "FF":
-            r = self.parse("%(bk)s %(ch)s" % crng[0])
-            LOG.debug("get_vs, FF: r = %r" % r)
-            return r[0][1].vs
+            if token == "FF":
+                return verses
+            return min(int(self.clean_intstr(crng[0].vs) or 0) + 1, verses)
         else:
             return token
 
+    def following_book(self, crng):
+        """the book of crng, which "F" and "FF" refer to"""
+        if crng[0].bk is None:
+            raise ValueError("no book for a following ch or vs: %r" % crng)
+        return crng[0].bk
+
     def append_range(self, rng, liste):
-        rng = self.clean_up_range(rng)
-        LOG.debug("--> append range = %r" % rng)
+        stats = self.get("stats")
+        if stats is None:
+            rng = self.clean_up_range(rng)
+        else:
+            with stats.timer("fill_range"):
+                rng = self.clean_up_range(rng)
+        LOG.debug("--> append range = %r", rng)
         liste.append(rng)
 
     def create_range(self):
         rng = RefRange((Ref(), Ref()))
         return rng
 
-    def refstring(self, ref):
-        return self.clean_refstring(self.format(ref))
+    def refstring(self, ref, bkarg="name"):
+        """the canonical refstring for a RefList, such as "Gen.1.1-3;John.3.16": the same
+        as clean_refstring(format(ref, bkarg=bkarg)), but built directly by
+        format_refstring() when it can be, which leaves the refs unchanged.
+        """
+        stats = self.get("stats")
+        if stats is not None:
+            start = time.perf_counter()
+        refstr = self.format_refstring(ref, bkarg=bkarg)
+        if refstr is None:
+            refstr = self.clean_refstring(self.format(ref, bkarg=bkarg))
+        if stats is not None:
+            stats.add("refstring", time.perf_counter() - start)
+        return refstr
+
+    def format_refstring(self, inrefs, bkarg="name"):
+        """Format a RefList as a canonical refstring, as refstring() does, joining the
+        parts in a list. The book labels are looked up in self.refstring_labels. Returns None
+        if clean_refstring() might treat the result differently from its parts: a label
+        that isn't in refstring_labels, a ch or vs that isn't an int, or a vsub
+        other than one or two letters. (The refs are read with get(), which is much faster
+        than the attribute access of bl.dict.Dict.)
+        """
+        parts = []
+        currbk = currch = currvs = 0
+        for startref, endref in inrefs:
+            if startref is None or startref == {}:
+                continue
+            bk, ch, vs = startref.get("bk"), startref.get("ch"), startref.get("vs")
+            vsub = refstring_vsub(startref.get("vsub"))
+            if type(ch) is not int or type(vs) is not int or vsub is None:
+                return None
+            if currbk != bk:
+                label = startref[bkarg]
+                if (
+                    bkarg == "title"
+                    and label == "Psalms"
+                    and endref is not None
+                    and bk == endref.get("bk")
+                    and ch == endref.get("ch")
+                ):
+                    label = "Psalm"  # as in format()
+                label = self.refstring_labels.get(label)
+                if label is None:
+                    return None
+                if parts:
+                    parts.append(";")
+                parts += [label, ".", str(ch), ".", str(vs), vsub]
+            elif currch != ch:
+                parts += [";", str(ch), ".", str(vs), vsub]
+            else:
+                parts += [",", str(vs), vsub]
+            currbk, currch, currvs = bk, ch, vs
+
+            if endref is None or endref == {}:
+                continue
+            endbk, endch, endvs = endref.get("bk"), endref.get("ch"), endref.get("vs")
+            if currbk == endbk and currch == endch and currvs == endvs:
+                continue
+            endvsub = refstring_vsub(endref.get("vsub"))
+            if type(endch) is not int or type(endvs) is not int or endvsub is None:
+                return None
+            if currbk == endbk:
+                if currch == endch:
+                    parts += ["-", str(endvs), endvsub]
+                else:
+                    parts += ["-", str(endch), ".", str(endvs), endvsub]
+            else:
+                # format() copies the start label to an endref that doesn't have one
+                label = endref[bkarg] if bkarg in endref else startref[bkarg]
+                label = self.refstring_labels.get(label)
+                if label is None:
+                    return None
+                parts += ["-", label, ".", str(endch), ".", str(endvs), endvsub]
+        return "".join(parts)
+
+    def normalize_label(self, label):
+        """the label as clean_refstring() leaves it in a refstring, or None if that depends
+        on where it is: it is cleaned with a ch and vs after it, at the start of a refstring
+        and after each separator that format() can put before a label, and must come out
+        the same each time.
+        """
+        if not isinstance(label, str) or not label.strip():
+            return None
+        cleaned = [
+            self.clean_refstring("%s%s 1:1" % (before, label))
+            for before in ["", "1:1; ", "1:1\u2014"]
+        ]
+        normalized = cleaned[0][:-4]
+        if cleaned != [
+            "%s.1.1" % normalized,
+            "1.1;%s.1.1" % normalized,
+            "1.1-%s.1.1" % normalized,
+        ]:
+            return None
+        return normalized or None
 
     def clean_refstring(self, refstr=""):
         """cleanup refstr:
@@ -346,85 +641,79 @@ class RefParser(Dict):
         """
         if refstr is None:
             return None
-        refstr = re.sub(r"(^\W+|\W+$)", "", refstr)
-        refstr = re.sub(r"[\(\)\[\]\{\}\<\>]", "", refstr)  # remove brackets and parens
+        first, last = refstr[:1], refstr[-1:]
+        if not (first.isalnum() or first == "_") or not (last.isalnum() or last == "_"):
+            refstr = CLEAN_EDGES.sub("", refstr)  # leading and trailing non-word chars
+        # brackets, backslashes, entities, tabs, newlines, non-ASCII chars
+        special = CLEAN_SPECIAL.search(refstr) is not None
+        if special:
+            refstr = refstr.translate(CLEAN_BRACKETS)  # remove brackets and parens
         refstr = refstr.strip()  # Remove leading and trailing whitespace
         refstr = refstr.strip("-,;.")  # leading and trailing separators
         refstr = refstr.replace("and", ",")
         refstr = refstr.replace("; ", ";")
-        refstr = refstr.replace(":", ".")
-        refstr = refstr.replace("_", " ")
-        refstr = refstr.replace("\\", "")
-        refstr = refstr.replace("&#160;", " ")
-        refstr = refstr.replace("\u00a0", " ")
-        refstr = refstr.replace("\t", " ")
-        refstr = refstr.replace("&#150;", "-")
-        refstr = refstr.replace("&#151;", "-")
-        refstr = refstr.replace("&#8211;", "-")
-        refstr = refstr.replace("&#8212;", "-")
-        refstr = refstr.replace("&#x2010;", "-")
-        refstr = refstr.replace("&#x2011;", "-")
-        refstr = refstr.replace("&#x2012;", "-")
-        refstr = refstr.replace("&#x2013;", "-")
-        refstr = refstr.replace("&#x2014;", "-")
-        refstr = refstr.replace("\u2010", "-")
-        refstr = refstr.replace("\u2011", "-")
-        refstr = refstr.replace("\u2011", "-")
-        refstr = refstr.replace("\u2013", "-")
-        refstr = refstr.replace("\u2014", "-")
-        refstr = refstr.replace("\x96", "-")
-        refstr = refstr.replace("\x97", "-")
-        refstr = refstr.replace("\r", ";")
-        refstr = refstr.replace("\n", ";")
+        if special:
+            refstr = refstr.translate(CLEAN_SEPARATORS)
+            if "&#" in refstr:
+                refstr = CLEAN_ENTITIES.sub(clean_entity, refstr)
+            refstr = refstr.translate(CLEAN_SPACES_DASHES)
+        else:
+            refstr = refstr.replace(":", ".").replace("_", " ")
         refstr = refstr.replace(" -", "-")
         refstr = refstr.replace("- ", "-")
-        while ";;" in refstr:
-            refstr = refstr.replace(";;", ";")
-        while "--" in refstr:
-            refstr = refstr.replace("--", "-")
-        while "  " in refstr:
-            refstr = refstr.replace("  ", " ")
-        while ".." in refstr:
-            refstr = refstr.replace("..", ".")
-        while ",," in refstr:
-            refstr = refstr.replace(",,", ",")
+        if (
+            ";;" in refstr
+            or "--" in refstr
+            or "  " in refstr
+            or ".." in refstr
+            or ",," in refstr
+        ):
+            refstr = CLEAN_REPEATS.sub(r"\1", refstr)
         refstr = refstr.replace(" ,", ",")
         refstr = refstr.replace(", ", ",")
         refstr = refstr.replace(" ;", ";")
         refstr = refstr.replace("; ", ";")
-        refstr = re.sub(r"([123])\s+([A-Za-z])", r"\1\2", refstr)
-        # refstr = refstr.replace('1 ', '1')
-        # refstr = refstr.replace('2 ', '2')
-        # refstr = refstr.replace('3 ', '3')
-        # refstr = refstr.replace('4 ', '4')
-        # refstr = refstr.replace('5 ', '5')
-        # refstr = refstr.replace('6 ', '6')
-        # refstr = refstr.replace('7 ', '7')
-        # refstr = refstr.replace('8 ', '8')
-        # refstr = refstr.replace('9 ', '9')
-        # refstr = refstr.replace('0 ', '0')
+        refstr = CLEAN_NUMBERED_BOOK.sub(r"\1\2", refstr)
+        # case-insensitive patterns can match non-ASCII chars, such as "ſ" for "s"
+        folded = refstr.lower() if refstr.isascii() else None
         # These number words are sometimes used in the ordinal book names
         # (1 John, etc.).
-        refstr = re.sub(r"(?i)first\s*", "1", refstr)
-        refstr = re.sub(r"(?i)second\s*", "2", refstr)
-        refstr = re.sub(r"(?i)third\s*", "3", refstr)
+        if (
+            folded is None
+            or "first" in folded
+            or "second" in folded
+            or "third" in folded
+        ):
+            refstr = CLEAN_NUMBER_WORDS.sub(clean_number_word, refstr)
         refstr = refstr.replace(" ", ".")
-        refstr = re.sub(r"Song\.[^0-9]*", "Song.", refstr)
-        refstr = re.sub(r"\.title", ".0", refstr, flags=re.I)
-        refstr = re.sub(r",\s*(heading|title)", "", refstr, flags=re.I)
-        refstr = re.sub(r"^The\W+", "", refstr)
+        if "Song." in refstr:
+            refstr = CLEAN_SONG.sub("Song.", refstr)
+        if folded is None or "title" in folded or "heading" in folded:
+            refstr = CLEAN_TITLE.sub(".0", refstr)
+            refstr = CLEAN_HEADING.sub("", refstr)
+        if refstr.startswith("The"):
+            refstr = CLEAN_THE.sub("", refstr)
         refstr = refstr.replace(".v.", ".1.")
 
-        # Pattern like 1,2Sam should become 1Sam–2Sam
-        refstr = re.sub(r"^(\d+),(\d+)(\w+)", r"\1\3-\2\3", refstr)
+        if refstr[:1].isdigit():
+            # Pattern like 1,2Sam should become 1Sam–2Sam
+            refstr = CLEAN_BOOK_LIST.sub(r"\1\3-\2\3", refstr)
 
-        # Pattern like 1-2Sam should become 1Sam-2Sam
-        refstr = re.sub(r"^(\d+)-(\d+)(\D+)", r"\1\3-\2\3", refstr)
+            # Pattern like 1-2Sam should become 1Sam-2Sam
+            refstr = CLEAN_BOOK_RANGE.sub(r"\1\3-\2\3", refstr)
 
         return refstr
 
     def clean_up_range(self, rng):
-        """fill the range and make sure ch and vs are ints, with any vs sub modifiers in sub"""
+        """fill the range and make sure ch and vs are ints, with any vs sub modifiers in sub.
+        A range with a chapter that is not in its book is not a reference:
+
+        >>> from bref import canons
+        >>> RefParser(canons.ESV).parse("1 Kgs 22-23")
+        Traceback (most recent call last):
+          ...
+        ValueError: no such chapter: 1Kgs 23
+        """
         rng = self.fill_range(rng)
         if rng[0].bk is not None and rng[0].id is None:
             rng[0].id = self.match_book(rng[0].bk).id
@@ -432,18 +721,22 @@ class RefParser(Dict):
         rng[1].ch = int(
             self.clean_intstr(rng[1].ch) or self.chapters_in(rng[0].bk)
         )  # rng[1].ch
+        for ref in rng:
+            # verses_in() is 0 for a chapter that is not in the book
+            if ref.bk is not None and self.verses_in(ref.bk, ref.ch) == 0:
+                raise ValueError("no such chapter: %s %s" % (ref.bk, ref.ch))
         if type(rng[0].vs) == str:
-            sub = re.search(r"[^0-9\W]+$", rng[0].vs)  # rng[0].vs
+            sub = VS_SUB.search(rng[0].vs)  # rng[0].vs
             intstr = self.clean_intstr(rng[0].vs)
             if sub is not None and type(intstr) == str and intstr in rng[0].vs:
-                LOG.debug("rng[0].vsub = %r" % sub.group(0))
+                LOG.debug("rng[0].vsub = %r", sub.group(0))
                 rng[0].vsub = sub.group(0)
             rng[0].vs = int(self.clean_intstr(rng[0].vs) or 1)
         if type(rng[1].vs) == str:
-            sub = re.search(r"[^0-9\W]+$", rng[1].vs)  # rng[1].vs
+            sub = VS_SUB.search(rng[1].vs)  # rng[1].vs
             intstr = self.clean_intstr(rng[1].vs)
             if sub is not None and type(intstr) == str and intstr in rng[1].vs:
-                LOG.debug("rng[1].vsub = %r" % sub.group(0))
+                LOG.debug("rng[1].vsub = %r", sub.group(0))
                 rng[1].vsub = sub.group(0)
             rng[1].vs = int(
                 self.clean_intstr(rng[1].vs) or self.verses_in(rng[1].bk, rng[1].ch)
@@ -489,21 +782,12 @@ class RefParser(Dict):
         ...         bible_ref.Ref(db, ch=4, vs=17)))).display()
         ('Gen 3:15', 'Gen 4:17')
         """
-        LOG.debug(
-            "fill range: %r"
-            % ([(rng[0].bk, rng[0].ch, rng[0].vs), (rng[1].bk, rng[1].ch, rng[1].vs)],)
-        )
+        debug = LOG.isEnabledFor(logging.DEBUG)
+        if debug:
+            LOG.debug("fill range: %r", rng)
         status = None
         if rng[0].bk is not None:
-            for book in self.canon.books:
-                if book.name == rng[0].bk:
-                    for key in [
-                        key
-                        for key in book.keys()
-                        if key not in ["chapters", "pattern", "rexp"]
-                    ]:
-                        rng[0][key] = book[key]
-                    break
+            self.copy_book_fields(rng[0].bk, rng[0])
             if rng[0].ch is not None:
                 if rng[0].vs is not None:
                     if rng[1].vs is None:
@@ -512,16 +796,7 @@ class RefParser(Dict):
                                 # rng[0] is full, rng[1] is empty, so the range is one verse
                                 status = "the range is one verse, make rng[1] = rng[0]"
                                 rng[1].bk = rng[0].bk
-                                for book in self.canon.books:
-                                    if book.name == rng[1].bk:
-                                        for key in [
-                                            key
-                                            for key in book.keys()
-                                            if key
-                                            not in ["chapters", "pattern", "rexp"]
-                                        ]:
-                                            rng[0][key] = book[key]
-                                        break
+                                self.copy_book_fields(rng[1].bk, rng[0])
                                 rng[1].ch = rng[0].ch
                                 rng[1].vs = rng[0].vs
                             else:
@@ -556,10 +831,12 @@ class RefParser(Dict):
                             rng[1].ch = rng[0].ch
                     else:
                         rng[1].ch = rng[1].ch or self.chapters_in(rng[1].bk)
-                        status += ", rng[1].ch=%s" % (str(rng[1].ch))
+                        if debug:
+                            status += ", rng[1].ch=%s" % (str(rng[1].ch))
                     if rng[1].vs is None:
                         rng[1].vs = self.verses_in(rng[1].bk, rng[1].ch) or 0
-                        status += ", rng[1].vs=%s" % (str(rng[1].vs))
+                        if debug:
+                            status += ", rng[1].vs=%s" % (str(rng[1].vs))
             else:
                 # rng[0].ch is None, but rng[0].bk is defined, so it's either a verse or
                 # range in a one ch book, or a range of books
@@ -580,21 +857,31 @@ class RefParser(Dict):
                         rng[1].bk = rng[0].bk
                     if rng[1].ch is None:
                         rng[1].ch = self.chapters_in(rng[1].bk)
-                        status += ", rng[1].ch=%s is last ch in book" % str(rng[1].ch)
+                        if debug:
+                            status += ", rng[1].ch=%s is last ch in book" % rng[1].ch
                     if rng[1].vs is None:
                         rng[1].vs = self.verses_in(rng[1].bk, rng[1].ch)
-                        status += ", rng[1].vs=%s is last vs in rng[1].ch" % str(
-                            rng[1].vs
-                        )
-        LOG.debug("=> %s" % status)
-        LOG.debug(
-            "filled range: %r"
-            % ([(rng[0].bk, rng[0].ch, rng[0].vs), (rng[1].bk, rng[1].ch, rng[1].vs)],)
-        )
+                        if debug:
+                            status += ", rng[1].vs=%s is last vs in rng[1].ch" % (
+                                rng[1].vs
+                            )
+        if debug:
+            LOG.debug("=> %s", status)
+            LOG.debug("filled range: %r", rng)
         rng[0].name = rng[0].bk
         rng[1].name = rng[1].bk
         return rng
 
+    def copy_book_fields(self, name, ref):
+        """give the ref the id and name of the first book with the given name, and point it
+        to the book's record for its other fields, rather than copying them into each ref
+        """
+        record = self.book_records.get(name)
+        if record is not None:
+            ref["id"] = record["id"]
+            ref["name"] = record["name"]
+            ref.set_book(record)
+
     def item_name(self, inrefs):
         return (
             self.format(
@@ -658,6 +945,10 @@ class RefParser(Dict):
         # elif type(inrefs)==RefRange:
         #     inrefs = RefList([inrefs])
 
+        stats = self.get("stats")
+        if stats is not None:
+            start = time.perf_counter()
+
         # KLUDGE: fix Psalm vs Psalms
         for ref in inrefs:
             if (
@@ -748,6 +1039,8 @@ class RefParser(Dict):
             else:
                 out += startrefstr + endrefstr
 
+        if stats is not None:
+            stats.add("format", time.perf_counter() - start)
         return out
 
     def refstr_from_ids(self, ids):
@@ -860,6 +1153,53 @@ def test_parse():
     """
 
 
+def refstring_vsub(vsub):
+    """the vsub as format_refstring() writes it, or None if it might need cleaning"""
+    if not vsub:
+        return ""
+    vsub = vsub.strip("_")
+    if len(vsub) <= 2 and vsub.isascii() and (vsub.isalpha() or not vsub):
+        return vsub
+    return None
+
+
+def copy_reflist(reflist):
+    """a copy of the RefList with new RefRanges and Refs, which keep their keys as they are"""
+    copy = RefList()
+    for refrange in reflist:
+        refs = []
+        for ref in refrange:
+            newref = ref.__class__.__new__(ref.__class__)
+            dict.update(newref, ref)
+            newref.set_book(ref.book)
+            refs.append(newref)
+        copy.append(refrange.__class__(refs))
+    return copy
+
+
+def debug_trace():
+    """LOG.debug if debug logging is on, else no_trace(): checked once per parse, rather
+    than in each of the parser's LOG.debug() calls"""
+    return LOG.debug if LOG.isEnabledFor(logging.DEBUG) else no_trace
+
+
+def no_trace(*args):
+    """a LOG.debug that does nothing"""
+
+
+# the RefParser in each ProcessPoolExecutor worker of RefParser.parse_many()
+WORKER_PARSER = None
+
+
+def init_worker(canon):
+    global WORKER_PARSER
+    WORKER_PARSER = RefParser(canon)
+
+
+def parse_in_worker(key):
+    return WORKER_PARSER.parse_cleaned(*key)
+
+
 if __name__ == "__main__":
     import doctest
 
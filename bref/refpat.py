@@ -1,30 +1,189 @@
+import logging
 import re
+import time
+from bisect import bisect_left, bisect_right
+
+from lxml import etree
+
+from .lru import LRUCache
+
+LOG = logging.getLogger(__name__)
+MISSING = object()
+
+
+def first_chars(pattern):
+    """
+    The set of characters that a match of the regular expression pattern can start with,
+    read from the literal prefixes of its alternatives, or None if that cannot be worked
+    out (e.g., it can start with \\w or match "").
+
+    Only the syntax of book patterns is read: literal characters, [...] sets of them,
+    \\b, groups, | and quantifiers. Anything else where the match can start, such as a
+    class like \\d or \\s whose members depend on Unicode, gives None.
+
+    >>> sorted(first_chars(r"\\b(?:(?:1|I)\\s*K\\w*?)\\b"))
+    ['1', 'I']
+    >>> sorted(first_chars(r"\\b(?:Song of)? ?(Solomon|Songs?)\\b"))
+    [' ', 'S']
+    >>> print(first_chars(r"\\w+"), first_chars(r"a?"), first_chars(r"\\d"))
+    None None None
+    """
+    try:
+        chars, nullable, end = scan_alternatives(pattern, 0)
+    except ValueError:
+        return None
+    if end != len(pattern) or nullable:
+        return None
+    return chars
+
+
+def scan_alternatives(pattern, i):
+    # (chars, nullable, end) for the alternatives from pattern[i] to the next unmatched
+    # ")" or the end. Raises ValueError if chars cannot be read.
+    chars, nullable = set(), False
+    while True:
+        alt_chars, alt_nullable, i = scan_sequence(pattern, i)
+        chars |= alt_chars
+        nullable = nullable or alt_nullable
+        if i < len(pattern) and pattern[i] == "|":
+            i += 1
+        else:
+            return chars, nullable, i
+
+
+def scan_sequence(pattern, i):
+    # (chars, nullable, end) for the items from pattern[i] to the next "|" or ")"
+    chars, nullable = set(), True
+    while i < len(pattern) and pattern[i] not in "|)":
+        item_chars, item_nullable, i = scan_item(pattern, i)
+        if i < len(pattern) and pattern[i] in "?*+{":
+            if pattern[i] == "{":
+                raise ValueError("repeat counts are not read: %r" % pattern)
+            item_nullable = item_nullable or pattern[i] in "?*"
+            i += 1
+            if i < len(pattern) and pattern[i] in "?+":  # lazy or possessive
+                i += 1
+        if nullable:
+            if item_chars is None:
+                raise ValueError("unknown first characters: %r" % pattern)
+            chars |= item_chars
+            nullable = item_nullable
+    return chars, nullable, i
+
+
+def scan_item(pattern, i):
+    # (chars, nullable, end) for one item at pattern[i]; chars is None if unknown
+    char = pattern[i]
+    if char == "(":
+        if pattern.startswith("(?:", i):
+            i += 3
+        elif pattern.startswith("(?", i):
+            raise ValueError("only plain groups are read: %r" % pattern)
+        else:
+            i += 1
+        chars, nullable, i = scan_alternatives(pattern, i)
+        if i >= len(pattern) or pattern[i] != ")":
+            raise ValueError("unbalanced group: %r" % pattern)
+        return chars, nullable, i + 1
+    elif char == "[":
+        end = pattern.find("]", i + 2)
+        members = pattern[i + 1 : end] if end > 0 else "^"  # noqa: E203
+        if members[0] == "^" or "\\" in members or "-" in members[1:-1]:
+            raise ValueError("only sets of literal characters are read: %r" % pattern)
+        return set(members), False, end + 1
+    elif char == "\\":
+        escaped = pattern[i + 1 : i + 2]  # noqa: E203
+        if escaped in ("b", "B"):
+            return set(), True, i + 2
+        elif escaped.isalnum() or not escaped:
+            return None, False, i + 2  # a class such as \\w, or unknown
+        return {escaped}, False, i + 2
+    elif char in "^$":
+        return set(), True, i + 1
+    elif char in ".*+?{":
+        return None, False, i + 1
+    return {char}, False, i + 1
+
+
+def alternation_pattern(alternatives):
+    """
+    Combine regular expressions into one alternation that matches the same text as
+    "(?:a|b|...)" but is much faster to search. The re engine tries every alternative at
+    every position in the text, so the alternatives are grouped, as in a one-level
+    prefix trie, by the characters that they can start with, and each group is tried
+    only where the text has one of its characters. Alternatives keep their order within
+    a group, so the same one matches.
+
+    >>> alternation_pattern([r"Ge\\w*", r"Ex\\w*", "G?n"])
+    '(?:(?=[EGn])(?:(?=E)(?:Ex\\\\w*)|(?=G)(?:Ge\\\\w*|G?n)|(?=n)(?:G?n)))'
+    """
+    groups = {}
+    for pattern in alternatives:
+        chars = first_chars(pattern)
+        if not chars:
+            return "(?:" + "|".join(alternatives) + ")"
+        for char in chars:
+            groups.setdefault(char, []).append(pattern)
+    return "(?:(?=[%s])(?:%s))" % (
+        "".join(re.escape(char) for char in sorted(groups)),
+        "|".join(
+            "(?=%s)(?:%s)" % (re.escape(char), "|".join(groups[char]))
+            for char in sorted(groups)
+        ),
+    )
 
 
 def book_pattern(canon):
-    return "(?:(?:" + "|".join([bk.pattern for bk in canon.books]) + ")\\.?)"
+    return "(?:" + alternation_pattern([bk.pattern for bk in canon.books]) + "\\.?)"
 
 
 def book_replacer(canon, attr, flags=re.IGNORECASE):
     """
     Create a function that can be used in re.sub() to replace a found book name with the
-    given book attribute
+    given book attribute. The books' strict patterns are compiled once per canon, and the
+    books of recently found names are kept in an LRUCache, so that each is looked up
+    rather than matched again.
     """
+    regexs, books_by_text = canon.derived(
+        "book_replacer",
+        (flags, tuple(book.pattern_strict for book in canon.books)),
+        lambda: (
+            [re.compile(book.pattern_strict, flags) for book in canon.books],
+            LRUCache(maxsize=4096),
+        ),
+    )
 
     def br(md):
         text = md.group(0)
-        for book in canon.books:
-            if re.match(book.pattern_strict, text, flags=flags) is not None:
-                return book[attr]
+        book = books_by_text.get(text, MISSING)
+        if book is MISSING:
+            book = books_by_text[text] = next(
+                (book for regex, book in zip(regexs, canon.books) if regex.match(text)),
+                None,
+            )
+        if book is not None:
+            return book[attr]
 
     return br
 
 
 def full_books_pattern(canon):
-    return "\\b(?:" + "|".join([bk.title % bk for bk in canon.books]) + ")\\b"
+    return "\\b" + alternation_pattern([bk.title % bk for bk in canon.books]) + "\\b"
 
 
 def make_patterns(canon):
+    """
+    The patterns for finding references in text in the given canon (see build_patterns).
+    They are built once per canon and shared, and rebuilt if the book patterns change.
+    """
+    return canon.derived(
+        "patterns",
+        tuple(book.pattern for book in canon.books),
+        lambda: build_patterns(canon),
+    )
+
+
+def build_patterns(canon):
     # == Build the regexps for finding references in text ==
     patterns = []
     # list of indexes of patterns that should be repeated until the result is the same
@@ -85,54 +244,262 @@ def make_patterns(canon):
     return {"patterns": patterns, "repeating": repeating, "regexs": regexs}
 
 
-def tag_refs_in_text(text, patterns, refparser=None, bk=None):
-    def repl_bref(md):
-        txt = md.group(1)
-        if refparser is not None:
-            try:
-                refstr = refparser.refstring(refparser.parse(txt, bk=bk))
-            except Exception as exc:
-                print("RefParser.parse ERROR:", txt, " -- ", str(exc))
-                return txt
-            tagged = """<ref name="%s">%s</ref>""" % (refstr, txt)
-        else:
-            tagged = """<ref>%s</ref>""" % (txt,)
-        return tagged
-
-    # get the first item ref to provide a book as context
-    for regex in patterns["regexs"]:
-        if patterns["regexs"].index(regex) in patterns["repeating"]:
-            t = re.sub(regex, repl_bref, text)
-            while t != text:
-                text = t
-                t = re.sub(regex, repl_bref, text)
-        else:
-            text = re.sub(regex, repl_bref, text)
+def ref_markup(name, txt):
+    """the <ref> tag for txt, with the given name (refstring) if it is not None"""
+    if name is None:
+        return "<ref>%s</ref>" % (txt,)
+    return """<ref name="%s">%s</ref>""" % (name, txt)
 
-    return text
+
+def tag_refs_in_text(text, patterns, refparser=None, bk=None, stats=None):
+    """
+    Return text with the references found by find_refs_in_text() tagged as
+    <ref name="...">...</ref> (or <ref>...</ref> when there is no refparser).
+    """
+    tagged = []
+    pos = 0
+    for start, end, name in find_refs_in_text(
+        text, patterns, refparser=refparser, bk=bk, stats=stats
+    ):
+        tagged += [text[pos:start], ref_markup(name, text[start:end])]
+        pos = end
+    tagged.append(text[pos:])
+    return "".join(tagged)
+
+
+def find_refs_in_text(text, patterns, refparser=None, bk=None, stats=None):
+    """
+    Find the references in text, as a sorted list of (start, end, name) spans. name is the
+    refstring of the parsed ref, or None when there is no refparser.
+
+    The patterns are applied in order, each in one pass over the text with the refs found
+    so far tagged, so patterns can look behind for "</ref>; " or ahead for '<ref name="'.
+    Matches inside the tags are ignored, and each match is parsed once; one that fails
+    to parse is not a ref. A repeating pattern is then re-checked only in the gaps next
+    to the refs it just added, until it adds no more, rather than over the whole text.
+
+    With a Stats (by default, the refparser's stats), the refs found by each pattern and
+    the time it took, including parsing its matches, are added to "pattern <index>".
+    """
+    if stats is None and refparser is not None:
+        stats = getattr(refparser, "stats", None)
+    spans = []
+    names = {}  # (start, end) -> name, or False if the text did not parse
+
+    def parse(start, end):
+        if (start, end) not in names:
+            txt = text[start:end]
+            if refparser is None:
+                name = None
+            else:
+                try:
+                    name = refparser.refstring(refparser.parse(txt, bk=bk))
+                except Exception as exc:
+                    # not on stdout, which bref-serve uses for its responses
+                    LOG.debug("RefParser.parse ERROR: %s -- %s", txt, exc)
+                    name = False
+            names[start, end] = name
+        return names[start, end]
+
+    def markup(span):
+        start, end, name = span
+        return ref_markup(name, text[start:end])
+
+    def refs_in(matches, gaps):
+        # the refs among regex matches in a string made of the given gaps between refs,
+        # each (position in the string, start in text, end in text), and their markup
+        positions = [gap[0] for gap in gaps]
+        found = []
+        for md in matches:
+            at, start, end = gaps[bisect_right(positions, md.start()) - 1]
+            if md.end() > at + end - start:
+                continue  # the match is in (or runs into) the markup of a ref
+            ref_start, ref_end = md.start(1) - at + start, md.end(1) - at + start
+            name = parse(ref_start, ref_end)
+            if name is not False:
+                found.append((ref_start, ref_end, name))
+        return found
+
+    def scan(regex):
+        # one pass of regex over the text with the refs found so far tagged
+        pieces, gaps = [], []
+        pos = length = 0
+        for start, end, name in spans:
+            pieces += [text[pos:start], ref_markup(name, text[start:end])]
+            gaps.append((length, pos, start))
+            length += len(pieces[-2]) + len(pieces[-1])
+            pos = end
+        pieces.append(text[pos:])
+        gaps.append((length, pos, len(text)))
+        return refs_in(regex.finditer("".join(pieces)), gaps)
+
+    def rescan(regex, i):
+        # the refs that regex finds in the gap before spans[i] (or after the last span)
+        # with the markup of the refs on either side
+        start = spans[i - 1][1] if i > 0 else 0
+        end = spans[i][0] if i < len(spans) else len(text)
+        before = markup(spans[i - 1]) if i > 0 else ""
+        after = markup(spans[i]) if i < len(spans) else ""
+        window = before + text[start:end] + after
+        return refs_in(regex.finditer(window, len(before)), [(len(before), start, end)])
+
+    for index, regex in enumerate(patterns["regexs"]):
+        if stats is not None:
+            start, found = time.perf_counter(), len(spans)
+        added = scan(regex)
+        spans = sorted(spans + added)
+        if index in patterns["repeating"]:
+            while added:
+                gaps = set()
+                for span in added:
+                    i = bisect_left(spans, span)
+                    gaps.update([i, i + 1])
+                added = [span for i in sorted(gaps) for span in rescan(regex, i)]
+                spans = sorted(spans + added)
+        if stats is not None:
+            stats.add(
+                "pattern %d" % index,
+                time.perf_counter() - start,
+                count=len(spans) - found,
+            )
+
+    return spans
+
+
+def ref_tag(element):
+    """the tag for <ref> elements inside element: in its default namespace, if any"""
+    ns = element.nsmap.get(None)
+    return "{%s}ref" % ns if ns is not None else "ref"
+
+
+def make_ref_elements(element, text, spans):
+    """
+    Create the <ref> elements for the given spans of text, each with the text that
+    follows it (up to the next span) as its tail.
+    """
+    reftag = ref_tag(element)
+    refs = []
+    for i, (start, end, name) in enumerate(spans):
+        following = spans[i + 1][0] if i + 1 < len(spans) else len(text)
+        ref = element.makeelement(reftag, {"name": name} if name is not None else {})
+        ref.text = text[start:end]
+        ref.tail = text[end:following] or None
+        refs.append(ref)
+    return refs
 
 
 def tag_refs_in_xml(x, patterns, xpath=None, namespaces=None, refparser=None, bk=None):
+    """
+    Tag the references in the text and tail of the elements selected by xpath (default,
+    all elements) in place, splitting the text at each reference and inserting a <ref>
+    element for it (see find_refs_in_text()). The text of elements with an href is left
+    alone.
+    """
     if xpath is None:
         elements = x.xpath(x.root, "//*")
     else:
         elements = x.xpath(x.root, xpath, namespaces=namespaces)
     for element in elements:
         if element.text is not None and element.get("href") is None:
-            element.text = tag_refs_in_text(
-                element.text, patterns, refparser=refparser, bk=bk
-            )
-        if element.tail is not None:
-            element.tail = tag_refs_in_text(
-                element.tail, patterns, refparser=refparser, bk=bk
-            )
-    t = re.sub("&lt;(ref[^&>]+)&gt;", r"<\1>", x.tostring()).replace(
-        "&lt;/ref&gt;", "</ref>"
-    )
-    try:
-        x.root = x.fromstring(t)
-    except Exception:
-        print(t)
-        raise
+            text = element.text
+            spans = find_refs_in_text(text, patterns, refparser=refparser, bk=bk)
+            if spans:
+                element.text = text[: spans[0][0]] or None
+                element[0:0] = make_ref_elements(element, text, spans)
+        parent = element.getparent()
+        if element.tail is not None and parent is not None:
+            tail = element.tail
+            spans = find_refs_in_text(tail, patterns, refparser=refparser, bk=bk)
+            if spans:
+                element.tail = tail[: spans[0][0]] or None
+                index = parent.index(element) + 1
+                parent[index:index] = make_ref_elements(parent, tail, spans)
 
     return x
+
+
+def tag_refs_in_xml_stream(
+    src, dest, patterns, refparser=None, bk=None, encoding="UTF-8"
+):
+    """
+    Tag the references in the XML document src (a filename or file object), writing the
+    result to dest (a filename or binary file object). This does the same tagging as
+    tag_refs_in_xml() on every element, but the document is parsed with iterparse() and
+    written with xmlfile() as it goes, so memory use stays bounded however large it is.
+    The <ref> elements are in the default namespace of the element that contains them.
+    """
+    with etree.xmlfile(dest, encoding=encoding) as xf:
+        xf.write_declaration()
+        # open elements: [element, writer context, node whose text or tail is pending]
+        stack = []
+
+        def write_text(element, text, tag=True):
+            if not text:
+                return
+            spans = tag and find_refs_in_text(
+                text, patterns, refparser=refparser, bk=bk
+            )
+            if not spans:
+                xf.write(text)
+                return
+            reftag = ref_tag(element)
+            pos = 0
+            for start, end, name in spans:
+                xf.write(text[pos:start])
+                with xf.element(
+                    reftag, attrib={"name": name} if name is not None else {}
+                ):
+                    xf.write(text[start:end])
+                pos = end
+            xf.write(text[pos:])
+
+        def write_pending():
+            # the text of the innermost open element, or the tail of its last child, is
+            # complete once the next child starts or the element ends.
+            item = stack[-1]
+            element, node = item[0], item[2]
+            if node is element:
+                write_text(element, element.text, tag=element.get("href") is None)
+            elif node is not None:
+                write_text(element, node.tail)
+                element.remove(node)
+            item[2] = None
+
+        for event, node in etree.iterparse(
+            src, events=("start", "end", "comment", "pi")
+        ):
+            if event == "start":
+                if stack:
+                    write_pending()
+                    parent_nsmap = stack[-1][0].nsmap
+                else:
+                    parent_nsmap = {}
+                    doctype = node.getroottree().docinfo.doctype
+                    if doctype:
+                        xf.write_doctype(doctype)
+                nsmap = {
+                    prefix: uri
+                    for prefix, uri in node.nsmap.items()
+                    if parent_nsmap.get(prefix) != uri
+                }
+                context = xf.element(node.tag, attrib=dict(node.attrib), nsmap=nsmap)
+                context.__enter__()
+                stack.append([node, context, node])
+            elif event == "end":
+                write_pending()
+                context = stack.pop()[1]
+                context.__exit__(None, None, None)
+                node.clear(keep_tail=True)
+                if stack:
+                    stack[-1][2] = node
+            else:
+                if stack:
+                    write_pending()
+                    stack[-1][2] = node
+                xf.write(node, with_tail=False)
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
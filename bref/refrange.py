@@ -1,5 +1,7 @@
 import functools
-import re
+
+from .ref import Ref
+from .refid import RefId
 
 
 @functools.total_ordering
@@ -29,12 +31,157 @@ class RefRange(list):
         return (self[0] == other[0]) and (self[1] == other[1])
 
     def __hash__(self):
-        # if __eq__() true, __hash__() will be the same (though the inverse is not true)
-        return int(re.sub(r"\D", "", self[0].key() + self[1].key()))
+        # if __eq__() true, __hash__() will be the same (though the inverse is not true).
+        # RefParser fills in RefRanges in place, so the hash is not cached: use freeze()
+        # for a FrozenRefRange, which caches its hash.
+        return hash((hash_key(self[0]), hash_key(self[1])))
 
     def contains(self, other):
+        """whether this range contains other: a RefRange or FrozenRefRange, or a Ref"""
+        if isinstance(other, Ref):
+            other = (other, other)
         return self[0] <= other[0] and self[1] >= other[1]
 
+    def freeze(self):
+        """return this range as a FrozenRefRange"""
+        return FrozenRefRange(RefId.from_ref(self[0]), RefId.from_ref(self[1]))
+
+    def ordinals(self, canon):
+        """the (first, last) verse ordinals of this range in the given canon. An end
+        without a chapter or verse runs to the end of its book or chapter."""
+        end = self[1]
+        if end.id is None:
+            raise ValueError("verse ordinals need Refs with a book id: %r" % end)
+        if end.ch is None:
+            last = canon.index.book_ordinals(end.id)[1]
+        elif end.vs is None:
+            last = canon.index.ordinal(
+                end.id, end.ch, canon.index.verses_in(end.id, end.ch)
+            )
+        else:
+            last = end.ordinal(canon)
+        return (self[0].ordinal(canon), last)
+
+    def verse_count(self, canon):
+        """the number of verses in this range in the given canon, from its ordinals"""
+        first, last = self.ordinals(canon)
+        return max(last - first + 1, 0)
+
+    def iter_verses(self, canon):
+        """the Refs of the verses in this range, one at a time, across chapters and books
+        (see CanonIndex.locations())"""
+        return iter_verses(canon, *self.ordinals(canon))
+
+
+def iter_verses(canon, first, last):
+    """the Refs of the verses from ordinal first to last in the canon, as
+    Ref.from_ordinal() makes them"""
+    book_id = name = None
+    for id, ch, vs in canon.index.locations(first, last):
+        if id != book_id:
+            book_id = id
+            name = canon.books[canon.index.book_positions[id]].name
+        yield Ref(id=id, bk=name, name=name, ch=ch, vs=vs)
+
+
+def hash_key(ref):
+    """a hashable key for the Ref that is equal whenever ref.key() is equal: the packed
+    RefId value and vsub when the Ref has a book id, otherwise the key() string"""
+    if ref.id is not None and 0 <= (ref.ch or 0) < 1000 and 0 <= (ref.vs or 0) < 1000:
+        return (
+            int(ref.id) * 1000000 + (ref.ch or 0) * 1000 + (ref.vs or 0),
+            ref.vsub or "",
+        )
+    return ref.key()
+
+
+class FrozenRefRange:
+    """An immutable range of two RefIds, which caches its hash, for use as a dict key or
+    in a set: for example, to dedupe parsed ranges. RefRange.freeze() creates one, and
+    thaw() converts it back to a RefRange.
+    """
+
+    __slots__ = ("start", "end", "hash")
+
+    def __init__(self, start, end):
+        object.__setattr__(self, "start", start)
+        object.__setattr__(self, "end", end)
+        object.__setattr__(
+            self, "hash", hash((start.value, start.vsub, end.value, end.vsub))
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenRefRange is immutable")
+
+    def __reduce__(self):
+        return (self.__class__, (self.start, self.end))
+
+    def thaw(self, canon=None):
+        """return this range as a RefRange, with book names if a canon is given"""
+        return RefRange((self.start.to_ref(canon), self.end.to_ref(canon)))
+
+    def __str__(self):
+        return "%s-%s" % (str(self.start), str(self.end))
+
+    def __repr__(self):
+        return "FrozenRefRange(%r, %r)" % (self.start, self.end)
+
+    def __getitem__(self, index):
+        return (self.start, self.end)[index]
+
+    def __iter__(self):
+        return iter((self.start, self.end))
+
+    def __len__(self):
+        return 2
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return (
+            self.hash == other.hash
+            and self.start == other.start
+            and self.end == other.end
+        )
+
+    def __lt__(self, other):
+        return (self.start < other.start) or (
+            (self.start == other.start) and (self.end < other.end)
+        )
+
+    def __gt__(self, other):
+        return (self.start > other.start) or (
+            (self.start == other.start) and (self.end > other.end)
+        )
+
+    def __le__(self, other):
+        return not self > other
+
+    def __ge__(self, other):
+        return not self < other
+
+    def contains(self, other):
+        """whether this range contains other: a FrozenRefRange or RefRange, or a Ref or
+        RefId, which are converted to RefIds first (so a Ref must have a book id)
+
+        >>> frozen = RefRange((Ref(id=1, ch=1, vs=1), Ref(id=1, ch=2, vs=5))).freeze()
+        >>> inner = RefRange((Ref(id=1, ch=1, vs=3), Ref(id=1, ch=2, vs=1)))
+        >>> frozen.contains(inner), frozen.contains(inner.freeze())
+        (True, True)
+        >>> frozen.contains(Ref(id=1, ch=2, vs=6)), frozen.contains(RefId(1002005))
+        (False, True)
+        """
+        if isinstance(other, RefRange):
+            other = other.freeze()
+        elif isinstance(other, Ref):
+            other = RefId.from_ref(other)
+        if isinstance(other, RefId):
+            other = (other, other)
+        return self.start <= other[0] and self.end >= other[1]
+
 
 if __name__ == "__main__":
     import doctest
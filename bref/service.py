@@ -0,0 +1,199 @@
+"""
+Parsing and tagging for asyncio applications. AsyncRefParser runs RefParser.parse() and
+refpat.tag_refs_in_text() in an executor, so that long texts don't block the event loop;
+concurrent identical requests share one computation, and results are kept in an LRU cache
+that is shared by all requests.
+
+serve_jsonlines() puts an AsyncRefParser behind a JSON-lines protocol on stdin and stdout
+(see bref-serve in bref.cli), so that other programs can use one warm parser:
+
+    {"id": 1, "method": "tag_refs_in_text", "params": {"text": "See Gen 1:1."}}
+    {"id": 1, "result": "See <ref name=\\"Gen.1.1\\">Gen 1:1</ref>."}
+"""
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from . import refpat
+from .canon import Canon
+from .lru import LRUCache
+from .refparser import RefParser, copy_reflist
+
+MISSING = object()
+
+
+def worker(canon):
+    """the (canon, refparser, patterns) for canon (a Canon or the name of one), built once
+    per canon in each process that uses them
+    """
+    if isinstance(canon, str):
+        canon = Canon.load_by_name(canon)
+    refparser = canon.derived("refparser", None, lambda: RefParser(canon))
+    return canon, refparser, refpat.make_patterns(canon)
+
+
+def parse_in_executor(canon, refstring, bk):
+    return worker(canon)[1].parse(refstring, bk=bk)
+
+
+def tag_refs_in_text_in_executor(canon, text, bk):
+    _, refparser, patterns = worker(canon)
+    return refpat.tag_refs_in_text(text, patterns, refparser=refparser, bk=bk)
+
+
+def parse_summary_in_executor(canon, refstring, bk):
+    refparser = worker(canon)[1]
+    reflist = refparser.parse(refstring, bk=bk)
+    return {
+        "refstring": refparser.refstring(reflist),
+        "ranges": [[str(rng[0]), str(rng[-1])] for rng in reflist],
+    }
+
+
+class AsyncRefParser:
+    """
+    Parse and tag references with canon (the name of a canon, or a Canon) without blocking
+    the event loop. The work is done in executor: by default a single thread, which keeps
+    the loop responsive; a ProcessPoolExecutor lets requests run in parallel, and each of
+    its processes loads the canon by name once (a Canon is pickled with every request).
+
+    Results are cached in an LRUCache of cache_size entries, and a request that is already
+    running is joined rather than repeated. Cancelling a request doesn't cancel the work
+    that other requests are waiting for.
+
+    Given a Stats (see bref.stats), the parser and patterns of this process add their
+    stage timings to it, which is only useful with the default executor.
+    """
+
+    def __init__(self, canon, executor=None, cache_size=1024, stats=None):
+        self.canon = canon
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.cache = LRUCache(maxsize=cache_size)
+        self.pending = {}
+        self.coalesced = 0
+        self.stats = stats
+        if stats is not None:
+            worker(canon)[1].stats = stats
+
+    def __repr__(self):
+        return "AsyncRefParser(%r, cache=%r)" % (self.canon, self.cache)
+
+    async def parse(self, refstring, bk=None):
+        """the RefList that RefParser.parse(refstring, bk=bk) returns"""
+        reflist = await self.run(parse_in_executor, refstring, bk)
+        return copy_reflist(reflist)  # the cached RefList is shared
+
+    async def parse_summary(self, refstring, bk=None):
+        """{"refstring": the canonical refstring, "ranges": [[start, end], ...]} for
+        refstring, formatted in the executor like the parsing, since the parser (with its
+        cache and stats) is not shared between threads"""
+        return await self.run(parse_summary_in_executor, refstring, bk)
+
+    async def tag_refs_in_text(self, text, bk=None):
+        """text with <ref> markup, as refpat.tag_refs_in_text() returns it"""
+        return await self.run(tag_refs_in_text_in_executor, text, bk)
+
+    async def run(self, func, *args):
+        """the result of func(self.canon, *args) in the executor, from the cache if it is
+        there or from the running computation if there is one"""
+        key = (func.__name__,) + args
+        result = self.cache.get(key, MISSING)
+        if result is not MISSING:
+            return result
+        future = self.pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, func, self.canon, *args)
+            self.pending[key] = future
+            future.add_done_callback(lambda future: self.finish(key, future))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    async def stats_snapshot(self):
+        """the snapshot() of self.stats, taken in the executor, where it is updated"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.stats.snapshot)
+
+    def finish(self, key, future):
+        del self.pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self.cache[key] = future.result()
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+async def serve_jsonlines(service, infile=None, outfile=None):
+    """
+    Answer JSON-lines requests from infile (default, sys.stdin) on outfile (default,
+    sys.stdout) until infile ends. Each request is an object with an "id" (returned with
+    the response), a "method", and "params":
+
+    * "tag_refs_in_text" {"text", "bk"} -> the tagged text
+    * "parse" {"refstring", "bk"} -> {"refstring": the canonical refstring,
+        "ranges": [[start, end], ...] as strings like "Gen.1.1"}
+    * "stats" {} -> the cache size, hits and misses, and coalesced requests, and with
+        the service's Stats, "stages": {name: {"count", "seconds"}} (see bref.stats)
+
+    Each response is {"id", "result"} or {"id", "error"}; a line that is not a request
+    object gets an error with "id": null. Requests are handled concurrently, so responses
+    can come back in a different order.
+    """
+    infile = infile or sys.stdin
+    outfile = outfile or sys.stdout
+    loop = asyncio.get_running_loop()
+    reader = ThreadPoolExecutor(max_workers=1)  # so that reading doesn't block the loop
+    tasks = set()
+
+    def respond(response):
+        outfile.write(json.dumps(response) + "\n")
+        outfile.flush()
+
+    async def handle(line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+            request_id = request.get("id")
+            params = request.get("params") or {}
+            method = request.get("method")
+            if method == "tag_refs_in_text":
+                result = await service.tag_refs_in_text(
+                    params["text"], bk=params.get("bk")
+                )
+            elif method == "parse":
+                result = await service.parse_summary(
+                    params["refstring"], bk=params.get("bk")
+                )
+            elif method == "stats":
+                result = {
+                    "cache_size": len(service.cache),
+                    "hits": service.cache.hits,
+                    "misses": service.cache.misses,
+                    "coalesced": service.coalesced,
+                }
+                if service.stats is not None:
+                    result["stages"] = await service.stats_snapshot()
+            else:
+                raise ValueError("unknown method: %r" % method)
+            respond({"id": request_id, "result": result})
+        except Exception as exc:
+            error = "%s: %s" % (type(exc).__name__, exc)
+            respond({"id": request_id, "error": error})
+
+    try:
+        while True:
+            line = await loop.run_in_executor(reader, infile.readline)
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.ensure_future(handle(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+    finally:
+        reader.shutdown(wait=False)
@@ -0,0 +1,272 @@
+"""
+Verse mappings between canons, which number some verses differently (see
+resources/versification.xml). A Versification converts the verse ordinals of one canon
+(see CanonIndex) to those of another through two arrays, the first and last target
+ordinal of each source verse, so that converting refs and ranges in bulk is one lookup
+per end of each range.
+
+>>> from bref import canons
+>>> from bref.refparser import RefParser
+>>> v = Versification.between(canons.ESV, canons.NIV)
+>>> print(v.convert(RefParser(canons.ESV).parse("3 John 13-15; Rev 12")))
+[3Jn.1.13-3Jn.1.14, Rev.12.1-Rev.12.17]
+>>> print(Versification.between("NIV", "ESV").convert(RefParser(canons.NIV).parse("3 John 14")))
+[3Jn.1.14-3Jn.1.15]
+
+NIV counts the title of Psalm 3 as verse 1; ESV counts it with verse 1, as CanonIndex
+does with a verse 0:
+
+>>> print(v.convert(RefParser(canons.ESV).parse("Ps 3:1; Ps 3:8")))
+[Ps.3.1-Ps.3.2, Ps.3.9-Ps.3.9]
+
+HCSB begins some chapters earlier, and its tables stop short in a few chapters: a range
+is clipped to the verses that have a counterpart, and left out if none do.
+
+>>> to_hcsb = Versification.between("ESV", "HCSB")
+>>> print(to_hcsb.convert(RefParser(canons.ESV).parse("Exod 35:29-30; Ezra 2; Ezra 2:30-31")))
+[Exodus.35.29-Exodus.36.1, Ezra.2.1-Ezra.2.27]
+
+Where the tables don't say which verse a chapter has more or less, the verses map by
+number and the odd one is taken to be the last (see the limits in versification.xml):
+
+>>> print(Versification.between("ESV", "NLT").convert(RefParser(canons.ESV).parse("Neh 8:18")))
+[Neh.8.18-Neh.8.19]
+"""
+from array import array
+from pathlib import Path
+
+from bxml import XML
+
+from .canon import Canon
+from .ns import NS
+from .reflist import RefList
+
+EXCEPTIONS_PATH = Path(__file__).absolute().parent / "resources" / "versification.xml"
+
+# the exceptions file, parsed on first use:
+# [(from names, to names, [(tag, ref, to or offset), ...])]
+EXCEPTIONS = None
+
+
+class Versification:
+    """
+    The mapping of the verses of the source canon onto the target canon. starts[o] and
+    ends[o] are the first and last target ordinals of source ordinal o, or -1 if the
+    verse has no counterpart (its book or chapter is not in the target canon).
+    """
+
+    def __init__(self, source, target, exceptions=None):
+        self.source = source
+        self.target = target
+        self.starts = array("l")
+        self.ends = array("l")
+        self.build_default()
+        for tag, ref, value in exceptions if exceptions is not None else ():
+            if tag == "chapter":
+                self.apply_chapter_offset(ref, int(value))
+            else:
+                self.apply_exception(ref, value)
+
+    def __repr__(self):
+        return "Versification(%r, %r)" % (self.source, self.target)
+
+    @classmethod
+    def between(cls, source, target):
+        """the Versification from source to target (canons or canon names), built once
+        per pair with the exceptions in resources/versification.xml, and kept on the
+        source canon.
+        """
+        if isinstance(source, str):
+            source = Canon.load_by_name(source)
+        if isinstance(target, str):
+            target = Canon.load_by_name(target)
+        return source.derived(
+            "versification %s" % target.name,
+            (target.index, tuple(load_exceptions(source.name, target.name))),
+            lambda: cls(source, target, load_exceptions(source.name, target.name)),
+        )
+
+    def build_default(self):
+        """map each verse to the same book, chapter and verse in the target canon,
+        clamped to the target chapter, with the last verse of each source chapter
+        running to the end of the target chapter"""
+        sindex, tindex = self.source.index, self.target.index
+        for position, book_id in enumerate(sindex.book_ids):
+            tposition = tindex.book_positions.get(book_id)
+            tchapters = 0 if tposition is None else tindex.chapter_counts[tposition]
+            for index in range(
+                sindex.chapter_offsets[position], sindex.chapter_offsets[position + 1]
+            ):
+                verses = sindex.verse_counts[index]
+                ch = index - sindex.chapter_offsets[position] + 1
+                if ch > tchapters or verses == 0:
+                    self.starts.extend([-1] * verses)
+                    self.ends.extend([-1] * verses)
+                    continue
+                tchapter = tindex.chapter_offsets[tposition] + ch - 1
+                first = tindex.verse_offsets[tchapter]
+                tverses = tindex.verse_counts[tchapter]
+                if tverses == 0:
+                    self.starts.extend([-1] * verses)
+                    self.ends.extend([-1] * verses)
+                    continue
+                self.starts.extend(chapter_starts(verses, first, tverses))
+                self.ends.extend(chapter_ends(verses, first, tverses))
+
+    def apply_chapter_offset(self, ref, offset):
+        """map the source chapter ref ("id.ch") onto the same chapter of the target with
+        the verse numbers shifted by offset, as for a Psalm title counted as verse 1 in
+        one canon and not in the other (see resources/versification.xml)"""
+        book_id, ch = chapter_ref(ref)
+        sindex, tindex = self.source.index, self.target.index
+        verses = sindex.verses_in(book_id, ch)
+        tverses = (
+            tindex.verses_in(book_id, ch) if book_id in tindex.book_positions else 0
+        )
+        if verses == 0 or tverses == 0:
+            raise ValueError(
+                "no such chapter in %s and %s: %r"
+                % (self.source.name, self.target.name, ref)
+            )
+        sfirst = sindex.ordinal(book_id, ch, 1)
+        tfirst = tindex.ordinal(book_id, ch, 1)
+        self.starts[sfirst : sfirst + verses] = array(  # noqa: E203
+            "l", chapter_starts(verses, tfirst, tverses, offset)
+        )
+        self.ends[sfirst : sfirst + verses] = array(  # noqa: E203
+            "l", chapter_ends(verses, tfirst, tverses, offset)
+        )
+
+    def apply_exception(self, ref, to):
+        """map the source verses ref to the target verses to, each "id.ch.vs" or a range
+        of two of them, or to no verses if to is None (see resources/versification.xml)"""
+        first, last = range_ordinals(ref, self.source)
+        if to is None:
+            for ordinal in range(first, last + 1):
+                self.starts[ordinal] = self.ends[ordinal] = -1
+            return
+        tfirst, tlast = range_ordinals(to, self.target)
+        for ordinal in range(first, last + 1):
+            if last - first == tlast - tfirst:
+                self.starts[ordinal] = self.ends[ordinal] = tfirst + ordinal - first
+            else:
+                self.starts[ordinal], self.ends[ordinal] = tfirst, tlast
+
+    def convert_ordinals(self, pairs):
+        """the target (first, last) ordinals of the source (first, last) ordinal pairs.
+        A range whose first or last verses have no counterpart in the target canon is
+        clipped to the verses that do, and left out if none of them do.
+        """
+        starts, ends = self.starts, self.ends
+        result = []
+        for first, last in pairs:
+            start, end = starts[first], ends[last]
+            while start < 0 and first < last:
+                first += 1
+                start = starts[first]
+            while end < 0 and last > first:
+                last -= 1
+                end = ends[last]
+            if start >= 0 and end >= start:
+                result.append((start, end))
+        return result
+
+    def convert(self, reflist):
+        """the RefList in the target canon for a RefList in the source canon, range by
+        range (without merging them, as RefList.ordinals() would)"""
+        return RefList.from_ordinals(
+            self.convert_ordinals(
+                refrange.ordinals(self.source) for refrange in reflist
+            ),
+            self.target,
+        )
+
+    def convert_many(self, reflists):
+        """convert() each of the reflists"""
+        return [self.convert(reflist) for reflist in reflists]
+
+
+def chapter_ordinals(verses, tfirst, tverses, offset=0):
+    """the target ordinal of each verse of a source chapter with the given number of
+    verses, mapped to the target chapter that starts at ordinal tfirst: verse vs maps
+    to verse vs + offset, clamped to the target chapter"""
+    before = min(max(-offset, 0), verses)
+    after = min(max(verses + offset - tverses, 0), verses - before)
+    return (
+        [tfirst] * before
+        + list(range(tfirst + before + offset, tfirst + verses - after + offset))
+        + [tfirst + tverses - 1] * after
+    )
+
+
+def chapter_starts(verses, tfirst, tverses, offset=0):
+    """the chapter_ordinals() of the first target verse of each source verse: the first
+    verse also covers any target verses before it (as a title, verse 0, counts with
+    verse 1 in CanonIndex)"""
+    ordinals = chapter_ordinals(verses, tfirst, tverses, offset)
+    ordinals[0] = tfirst
+    return ordinals
+
+
+def chapter_ends(verses, tfirst, tverses, offset=0):
+    """the chapter_ordinals() of the last target verse of each source verse: the last
+    verse also covers the rest of a longer target chapter"""
+    ordinals = chapter_ordinals(verses, tfirst, tverses, offset)
+    ordinals[-1] = tfirst + tverses - 1
+    return ordinals
+
+
+def chapter_ref(refstr):
+    """the (book_id, ch) of "id.ch" """
+    parts = refstr.split(".")
+    if len(parts) != 2:
+        raise ValueError("not id.ch: %r" % refstr)
+    return int(parts[0]), int(parts[1])
+
+
+def range_ordinals(refstr, canon):
+    """the (first, last) ordinals in canon of "id.ch.vs" or "id.ch.vs-id.ch.vs" """
+    ends = [[int(n) for n in end.split(".")] for end in refstr.split("-")]
+    if len(ends) > 2 or any(len(end) != 3 for end in ends):
+        raise ValueError("not id.ch.vs or a range of them: %r" % refstr)
+    for book_id, ch, vs in ends:
+        if not 1 <= vs <= canon.index.verses_in(book_id, ch):
+            raise ValueError("no such verse in %s: %r" % (canon.name, refstr))
+    first = canon.index.ordinal(*ends[0])
+    return first, canon.index.ordinal(*ends[-1])
+
+
+def load_exceptions(source_name, target_name):
+    """the exceptions in resources/versification.xml from source to target, in order:
+    ("verses", ref, to) for a <verses> (to is None if it has no "to"), and
+    ("chapter", ref, offset) for a <chapter>"""
+    global EXCEPTIONS
+    if EXCEPTIONS is None:
+        x = XML(fn=str(EXCEPTIONS_PATH))
+        EXCEPTIONS = [
+            (
+                set(element.get("from").split()),
+                set(element.get("to").split()),
+                [
+                    (
+                        e.tag.replace("{%(bl)s}" % NS, ""),
+                        e.get("ref"),
+                        e.get("offset", e.get("to")),
+                    )
+                    for e in x.xpath(element, "bl:verses | bl:chapter", namespaces=NS)
+                ],
+            )
+            for element in x.xpath(x.root, "bl:map", namespaces=NS)
+        ]
+    return [
+        exception
+        for from_names, to_names, exceptions in EXCEPTIONS
+        if source_name in from_names and target_name in to_names
+        for exception in exceptions
+    ]
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
@@ -35,14 +35,23 @@ setup(
             "ipython~=8.6.0",
             "isort~=5.10.1",
         ],
+        "numpy": [
+            "numpy",
+        ],
         "test": [
             "black~=22.10.0",
             "flake8~=5.0.4",
         ],
     },
     packages=find_packages(exclude=["contrib", "docs", "tests*"]),
-    package_data={"bref": ["resources/canons/*.xml"]},
+    package_data={"bref": ["resources/canons/*.xml", "resources/versification.xml"]},
     data_files=[],
-    entry_points={},
+    entry_points={
+        "console_scripts": [
+            "bref-compile-canons = bref.cli:compile_canons",
+            "bref-tag = bref.cli:tag",
+            "bref-serve = bref.cli:serve",
+        ],
+    },
     scripts=[],
 )